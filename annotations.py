@@ -0,0 +1,115 @@
+import os
+import hashlib
+import numpy as np
+
+"""
+                                    ----------------------------------------------------------
+ Columnar annotation index for the dataset classes. A label file (Gaze360 / MPIIFaceGaze .label, SocialAI .csv)
+ is parsed once into a NumPy structured array: one column per field (image path, name, gaze in radians, filter
+ columns) instead of one raw string per sample that __getitem__ splits again at every access.
+ The array is cached in a .index folder next to the label file, keyed by the hash of the label file content and of
+ the parser, so an edited label file is parsed again automatically.
+
+     index = load_index(['datasets/Gaze360/Label/train.label'], parse_gaze360, 'gaze360')
+     index['face'][i], index['gaze'][i]   # path, (pitch, yaw) in radians
+"""
+
+INDEX_VERSION = 1
+
+
+def to_columns(**columns):
+    """Structured array with one field per keyword, the values of a field being a list or an array."""
+    columns = {name: np.asarray(values) for name, values in columns.items()}
+    length = len(next(iter(columns.values())))
+    records = np.empty(length, dtype=[(name, values.dtype, values.shape[1:]) for name, values in columns.items()])
+    for name, values in columns.items():
+        records[name] = values
+    return records
+
+
+def read_lines(path, header=True):
+    with open(path) as f:
+        lines = f.read().splitlines()
+    if header:
+        lines.pop(0)
+    return [line for line in lines if line.strip()]
+
+
+def parse_gaze360(paths):
+    """Gaze360 .label files: face, name and gaze2d (pitch, yaw in radians) columns."""
+    faces, names, gaze = [], [], []
+    for path in paths:
+        for line in read_lines(path):
+            line = line.strip().split(" ")
+            faces.append(line[0])
+            names.append(line[3])
+            gaze.append(line[5].split(","))
+    return to_columns(face=faces, name=names, gaze=np.array(gaze, dtype=np.float64).reshape(-1, 2))
+
+
+def parse_mpiigaze(paths):
+    """MPIIFaceGaze .label files: face, name and gaze2d (pitch, yaw in radians) columns."""
+    faces, names, gaze = [], [], []
+    for path in paths:
+        for line in read_lines(path):
+            line = line.strip().split(" ")
+            faces.append(line[0])
+            names.append(line[3])
+            gaze.append(line[7].split(","))
+    return to_columns(face=faces, name=names, gaze=np.array(gaze, dtype=np.float64).reshape(-1, 2))
+
+
+def csv_parser(columns):
+    """
+    Parser of comma separated annotation files. columns maps a field name to (position in the row, dtype),
+    e.g. {'path': (-2, str), 'yaw': (-5, np.float64)}; negative positions count from the end of the row.
+    """
+    def parse_csv(paths):
+        rows = [line.split(",") for path in paths for line in read_lines(path)]
+        values = {}
+        for name, (position, dtype) in columns.items():
+            if dtype is str:
+                values[name] = [row[position] for row in rows]
+            else:
+                values[name] = np.array([row[position] for row in rows]).astype(dtype)
+        return to_columns(**values)
+    parse_csv.key = 'csv:' + ','.join('{}={}:{}'.format(name, position, np.dtype(dtype).str)
+                                      for name, (position, dtype) in sorted(columns.items()))
+    return parse_csv
+
+
+def index_key(paths, parser_key):
+    digest = hashlib.sha1('{}:{}'.format(INDEX_VERSION, parser_key).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_index(paths, parse, parser_key=None, cache_dir=None):
+    """
+    Columnar index of the label files paths, read from the cache if they did not change since the last parse.
+    parser_key identifies the parse function and its settings in the cache key.
+    """
+    if not isinstance(paths, (list, tuple)):
+        paths = [paths]
+    parser_key = parser_key or getattr(parse, 'key', parse.__name__)
+    key = index_key(paths, parser_key)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(paths[0]), '.index')
+    cache = os.path.join(cache_dir, key + '.npy')
+    if os.path.exists(cache):
+        return np.load(cache)
+
+    index = parse(paths)
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # written under a temporary name so that concurrent loaders never read a partial file
+        tmp = cache + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, index)
+        os.replace(tmp, cache)
+    except OSError as e:
+        print('Annotation index not cached ({})'.format(e))
+    return index
@@ -0,0 +1,89 @@
+import torch
+import torch.nn.functional as F
+
+from labels import GAZE360
+from preprocess import MEAN, STD
+
+"""
+                                    ----------------------------------------------------------
+ Batched training augmentation, run on the collated batch on its device instead of per sample in the workers:
+
+     horizontal flip   p=flip, the yaw label is negated and binned again
+     small crops       random scale in [1 - crop, 1] and shift, resized back to the input size
+     color jitter      brightness, contrast and saturation factors in [1 - x, 1 + x]
+
+ The flip and the crop of every image are one affine sampling grid, so the whole batch is resampled by a single
+ grid_sample call. The batch can be uint8 (shards.py) or already normalized with MEAN/STD; the output is always
+ normalized float, as ToTensor + Normalize would give.
+
+     augment = BatchAugment(LAYOUTS['socialai'], yaw_column=0)
+     images, labels, cont_labels = augment(images.cuda(), labels.cuda(), cont_labels.cuda())
+"""
+
+
+class BatchAugment():
+    """
+    Flip (with label negation), crop and color jitter of a whole batch. yaw_column is the column of the yaw angle in
+    the labels: 0 for SocialAI (yaw, pitch), 1 for Gaze360 and MPIIGaze (pitch, yaw).
+    """
+    def __init__(self, layout=GAZE360, yaw_column=0, flip=0.5, crop=0.1, brightness=0.2, contrast=0.2,
+                 saturation=0.2):
+        self.layout = layout
+        self.yaw_column = yaw_column
+        self.flip = flip
+        self.crop = crop
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+
+    def factors(self, n, amount, device):
+        return 1 + (torch.rand(n, 1, 1, 1, device=device) * 2 - 1) * amount
+
+    def geometry(self, images, flipped):
+        n = images.shape[0]
+        scale = 1 - torch.rand(n, device=images.device) * self.crop
+        # shifts that keep the crop inside the image
+        shift = (torch.rand(n, 2, device=images.device) * 2 - 1) * (1 - scale).unsqueeze(1)
+        theta = torch.zeros(n, 2, 3, device=images.device)
+        theta[:, 0, 0] = scale * (1 - 2 * flipped.float())
+        theta[:, 1, 1] = scale
+        theta[:, :, 2] = shift
+        grid = F.affine_grid(theta, list(images.shape), align_corners=False)
+        return F.grid_sample(images, grid, mode='bilinear', padding_mode='border', align_corners=False)
+
+    def color(self, images):
+        n = images.shape[0]
+        luma = torch.tensor([0.299, 0.587, 0.114], device=images.device).view(1, 3, 1, 1)
+        if self.brightness:
+            images = images * self.factors(n, self.brightness, images.device)
+        gray = (images * luma).sum(1, keepdim=True)
+        if self.contrast:
+            mean = gray.mean((2, 3), keepdim=True)
+            images = (images - mean) * self.factors(n, self.contrast, images.device) + mean
+            gray = (images * luma).sum(1, keepdim=True)
+        if self.saturation:
+            images = (images - gray) * self.factors(n, self.saturation, images.device) + gray
+        return images.clamp_(0, 1)
+
+    @torch.no_grad()
+    def __call__(self, images, labels, cont_labels):
+        """uint8 or normalized float images (N, 3, H, W), bins (N, 2) and degrees (N, 2) -> augmented batch."""
+        device = images.device
+        mean = torch.tensor(MEAN, device=device).view(1, 3, 1, 1)
+        std = torch.tensor(STD, device=device).view(1, 3, 1, 1)
+        if images.dtype == torch.uint8:
+            images = images.float() / 255
+        else:
+            images = images * std + mean
+
+        flipped = torch.rand(images.shape[0], device=device) < self.flip
+        if self.crop or flipped.any():
+            images = self.geometry(images, flipped)
+        images = self.color(images)
+
+        cont_labels = cont_labels.clone()
+        cont_labels[:, self.yaw_column] = torch.where(flipped, -cont_labels[:, self.yaw_column],
+                                                      cont_labels[:, self.yaw_column])
+        labels = labels.clone()
+        labels[:, self.yaw_column] = self.layout.encode_tensor(cont_labels[:, self.yaw_column]).to(labels.dtype)
+        return (images - mean) / std, labels, cont_labels
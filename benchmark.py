@@ -0,0 +1,444 @@
+import os, argparse
+import time
+import numpy as np
+import cv2
+
+import torch
+from torch.utils.data import DataLoader
+from torchvision import transforms
+
+from PIL import Image
+from utils import select_device, getArch, set_cpu_threads
+from pipeline import GazePipeline
+from preprocess import FacePreprocessor, LEGACY_TOLERANCE
+from labels import GAZE360, encode_labels
+from augment import BatchAugment
+from utils_local import augmentation
+from mixed_precision import MixedPrecision
+from metrics import angular_errors, summarize
+from checkpoint import CheckpointWriter
+from loaders import make_loader, worker_count
+from trainer import load_config, build_datasets
+
+from face_detection import RetinaFace
+
+"""
+                                    ----------------------------------------------------------
+ Latency benchmarks for the inference path. Every mode prints the per-frame latency of the previous implementation
+ next to the current one so that the gain can be read directly from the output.
+
+     python benchmark.py --mode pipeline --snapshot models/L2CSNet_gaze360.pkl --source frames/ --frames 100
+     python benchmark.py --mode cpu --device cpu --threads 4 --channels_last
+     python benchmark.py --mode loader --config configs/socialai_lin.json --batch_size 16 --frames 200
+"""
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='Latency benchmarks for the L2CS-Net inference path.')
+    parser.add_argument(
+        '--mode', dest='mode', help='Benchmark to run: pipeline, faces, preprocess, cpu, model, labels, augment, amp, checkpoint, loader',
+        default='pipeline', type=str)
+    parser.add_argument(
+        '--snapshot', dest='snapshot', help='Path of model snapshot.',
+        default='models/L2CSNet_gaze360.pkl', type=str)
+    parser.add_argument(
+        '--arch', dest='arch', help='Network architecture, can be: ResNet18, ResNet34, ResNet50, ResNet101, ResNet152',
+        default='ResNet50', type=str)
+    parser.add_argument(
+        '--threads', dest='threads', help='Intra-op CPU threads [torch default]',
+        default=None, type=int)
+    parser.add_argument(
+        '--interop_threads', dest='interop_threads', help='Inter-op CPU threads [torch default]',
+        default=None, type=int)
+    parser.add_argument(
+        '--channels_last', dest='channels_last', help='Run the model in channels_last memory format',
+        action='store_true')
+    parser.add_argument(
+        '--gpu', '--device', dest='gpu_id', help='GPU device id to use [0] or cpu',
+        default="0", type=str)
+    parser.add_argument(
+        '--source', dest='source', help='Video file, image file or folder of frames used as input.',
+        default='frame/frame', type=str)
+    parser.add_argument(
+        '--frames', dest='frames', help='Number of timed frames.',
+        default=50, type=int)
+    parser.add_argument(
+        '--faces', dest='faces', help='Comma separated numbers of faces per frame for the faces mode.',
+        default='1,2,4,8,16', type=str)
+    parser.add_argument(
+        '--batch_size', dest='batch_size', help='Faces per forward pass for the cpu mode.',
+        default=1, type=int)
+    parser.add_argument(
+        '--config', dest='config', help='Trainer config of the dataset read by the loader mode.',
+        default='configs/socialai_lin.json', type=str)
+    parser.add_argument(
+        '--epochs', dest='epochs', help='Passes over --frames batches for the loader mode.',
+        default=3, type=int)
+    parser.add_argument(
+        '--warmup', dest='warmup', help='Number of untimed warm-up frames.',
+        default=5, type=int)
+    args = parser.parse_args()
+    return args
+
+
+def load_frames(source, count):
+    """Read up to count BGR frames from a video file, an image file or a folder of images."""
+    frames = []
+    if os.path.isdir(source):
+        images = sorted(img for img in os.listdir(source) if img.lower().endswith((".jpg", ".jpeg", ".png")))
+        for image in images[:count]:
+            frames.append(cv2.imread(os.path.join(source, image)))
+    elif source.lower().endswith((".jpg", ".jpeg", ".png")):
+        frames.append(cv2.imread(source))
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < count:
+            success, frame = cap.read()
+            if not success:
+                break
+            frames.append(frame)
+        cap.release()
+    if len(frames) == 0:
+        raise IOError("No frame could be read from {}".format(source))
+    # loop over short sources so that every run times the same number of frames
+    return [frames[i % len(frames)] for i in range(count)]
+
+
+def time_frames(fn, frames, warmup):
+    """Per-frame latencies in milliseconds of fn over frames."""
+    for frame in frames[:warmup]:
+        fn(frame)
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        fn(frame)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return np.array(latencies)
+
+
+def report(name, latencies):
+    print('{:<28} mean {:8.2f} ms  median {:8.2f} ms  p95 {:8.2f} ms  ({:.1f} frames/s)'.format(
+        name, latencies.mean(), np.median(latencies), np.percentile(latencies, 95), 1000.0 / latencies.mean()))
+
+
+def bench_pipeline(args, frames):
+    pipeline = GazePipeline(args.snapshot, arch=args.arch, gpu_id=args.gpu_id, threads=args.threads,
+                            interop_threads=args.interop_threads, channels_last=args.channels_last)
+
+    def legacy(frame):
+        # what every prediction() used to do before touching the frame
+        gpu = select_device(args.gpu_id, batch_size=16)
+        pipeline.model.to(gpu)
+        pipeline.model.eval()
+        pipeline.detector = RetinaFace(gpu_id=0 if gpu.type == 'cuda' else -1)
+        return pipeline.predict(frame)
+
+    report('per-frame setup', time_frames(legacy, frames, args.warmup))
+    report('GazePipeline.predict', time_frames(pipeline.predict, frames, args.warmup))
+
+
+def bench_faces(args, frames):
+    pipeline = GazePipeline(args.snapshot, arch=args.arch, gpu_id=args.gpu_id, threads=args.threads,
+                            interop_threads=args.interop_threads, channels_last=args.channels_last)
+    bboxes, scores = pipeline.detect(frames[0])
+    if len(bboxes) == 0:
+        # no face in the source, the whole frame is used as a crop
+        h, w = frames[0].shape[:2]
+        bboxes = np.array([[0, 0, w, h]])
+
+    for n in [int(n) for n in args.faces.split(',')]:
+        crowd = np.repeat(bboxes[:1], n, axis=0)
+
+        def per_face(frame):
+            for i in range(n):
+                pipeline.estimate(frame, crowd[i:i + 1])
+
+        def batched(frame):
+            pipeline.estimate(frame, crowd)
+
+        print('{} faces per frame'.format(n))
+        report('  one forward per face', time_frames(per_face, frames, args.warmup))
+        report('  one forward per frame', time_frames(batched, frames, args.warmup))
+
+
+def bench_preprocess(args, frames):
+    """
+    CPU time per face of the PIL preprocessing vs the fused one, and their numerical difference. The fused path
+    resizes the crop once to 448 instead of 224 then 448, so the two differ: only the mean difference is checked.
+    """
+    transformations = transforms.Compose([
+        transforms.Resize(448),
+        transforms.ToTensor(),
+        transforms.Normalize(
+            mean=[0.485, 0.456, 0.406],
+            std=[0.229, 0.224, 0.225]
+        )
+    ])
+    preprocess = FacePreprocessor(448, device=torch.device('cpu'))
+    h, w = frames[0].shape[:2]
+    # a centered face-sized box, the crop content does not matter for the timing
+    side = min(h, w) // 3
+    bbox = np.array([[w // 2 - side // 2, h // 2 - side // 2, w // 2 + side // 2, h // 2 + side // 2]])
+
+    def legacy(frame):
+        x_min, y_min, x_max, y_max = bbox[0]
+        img = frame[y_min:y_max, x_min:x_max]
+        img = cv2.resize(img, (224, 224))
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        im_pil = Image.fromarray(img)
+        return transformations(im_pil).unsqueeze(0)
+
+    def fused(frame):
+        return preprocess(frame, bbox)
+
+    report('PIL transform (per face)', time_frames(legacy, frames, args.warmup))
+    report('fused (per face)', time_frames(fused, frames, args.warmup))
+
+    diff = torch.cat([(legacy(frame) - fused(frame)).abs().flatten() for frame in frames[:10]])
+    print('parity over {} crops: max abs diff {:.4f}, mean abs diff {:.4f} (normalized units, tolerance {})'.format(
+        min(len(frames), 10), diff.max().item(), diff.mean().item(), LEGACY_TOLERANCE))
+    assert diff.mean().item() < LEGACY_TOLERANCE, \
+        'fused preprocessing differs from the PIL transform by {:.4f} on average'.format(diff.mean().item())
+
+
+def bench_cpu(args):
+    """Faces per second of the bare L2CS forward pass on CPU for the ResNet18/34/50 backbones."""
+    threads, interop_threads = set_cpu_threads(args.threads, args.interop_threads)
+    memory_format = torch.channels_last if args.channels_last else torch.contiguous_format
+    print('CPU threads: intra-op {}, inter-op {}, channels_last {}, batch_size {}'.format(
+        threads, interop_threads, args.channels_last, args.batch_size))
+    images = torch.randn(args.batch_size, 3, 448, 448).contiguous(memory_format=memory_format)
+    for arch in ['ResNet18', 'ResNet34', 'ResNet50']:
+        model = getArch(arch, 90).to(memory_format=memory_format)
+        model.eval()
+        with torch.no_grad():
+            latencies = time_frames(model, [images] * args.frames, args.warmup)
+        print('{:<10} {:8.2f} ms per batch  {:8.1f} faces/s'.format(
+            arch, latencies.mean(), 1000.0 * args.batch_size / latencies.mean()))
+
+
+def bench_model(args):
+    """L2CS vs L2CSInference (no fc_finetune, folded BatchNorm): outputs, parameters, load time and latency."""
+    gpu = select_device(args.gpu_id, batch_size=args.batch_size)
+    if os.path.exists(args.snapshot):
+        saved_state_dict = torch.load(args.snapshot, map_location='cpu')
+    else:
+        print('{} not found, using random weights.'.format(args.snapshot))
+        saved_state_dict = getArch(args.arch, 90).state_dict()
+
+    start = time.perf_counter()
+    model = getArch(args.arch, 90)
+    model.load_state_dict(saved_state_dict)
+    model.to(gpu).eval()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lean = getArch(args.arch, 90, inference=True)
+    lean.load_snapshot(saved_state_dict)
+    lean.eval()
+    lean.fold_bn()
+    lean.to(gpu)
+    lean_load_time = time.perf_counter() - start
+
+    images = torch.randn(args.batch_size, 3, 448, 448, device=gpu)
+    with torch.no_grad():
+        outputs = model(images)
+        lean_outputs = lean(images)
+        diff = max((a - b).abs().max().item() for a, b in zip(outputs, lean_outputs))
+        # cuDNN runs fp32 convolutions in TF32 by default, which rounds more than the folding itself
+        tolerance = 1e-2 if gpu.type == 'cuda' else 1e-3
+        for head, lean_head in zip(outputs, lean_outputs):
+            assert torch.allclose(head, lean_head, rtol=tolerance, atol=tolerance), \
+                'L2CSInference logits differ from L2CS by {:.2e} (tolerance {:.0e})'.format(diff, tolerance)
+        latencies = time_frames(model, [images] * args.frames, args.warmup)
+        lean_latencies = time_frames(lean, [images] * args.frames, args.warmup)
+    print('max abs logit diff {:.2e} (tolerance {:.0e})'.format(diff, tolerance))
+    print('{:<14} {:>12} params  load {:6.2f} s'.format(
+        'L2CS', sum(p.numel() for p in model.parameters()), load_time))
+    print('{:<14} {:>12} params  load {:6.2f} s'.format(
+        'L2CSInference', sum(p.numel() for p in lean.parameters()), lean_load_time))
+    report('L2CS', latencies)
+    report('L2CSInference', lean_latencies)
+
+
+def bench_labels(args):
+    """Per-item label work of the dataset classes: binning in __getitem__ vs binning the whole dataset once."""
+    count = 27000
+    gaze = np.random.uniform(-np.pi / 3, np.pi / 3, (count, 2))
+
+    def legacy(i):
+        label = torch.from_numpy(gaze[i]).type(torch.FloatTensor)
+        pitch = label[0] * 180 / np.pi
+        yaw = label[1] * 180 / np.pi
+        bins = np.array(range(-180, 180, 4))
+        binned_pose = np.digitize([pitch, yaw], bins) - 1
+        return binned_pose, torch.FloatTensor([pitch, yaw])
+
+    start = time.perf_counter()
+    cont_labels, labels = encode_labels(gaze, GAZE360)
+    encode_time = time.perf_counter() - start
+
+    def precomputed(i):
+        return labels[i], torch.tensor(cont_labels[i])
+
+    items = list(range(count))
+    report('per-item binning (per item)', time_frames(legacy, items, args.warmup))
+    report('precomputed (per item)', time_frames(precomputed, items, args.warmup))
+    print('binning the {} labels at construction: {:.2f} ms'.format(count, encode_time * 1000.0))
+    mismatch = sum(int((legacy(i)[0] != labels[i]).any()) for i in items)
+    print('bins differing from the per-item binning: {}'.format(mismatch))
+
+
+def bench_augment(args):
+    """Per-sample flip of numpy images (utils_local.augmentation) vs BatchAugment on the collated batch."""
+    gpu = select_device(args.gpu_id, batch_size=args.batch_size)
+    images = np.random.randint(0, 256, (args.batch_size, 448, 448, 3), dtype=np.uint8)
+    cont_labels = np.random.uniform(-60, 60, (args.batch_size, 2)).astype(np.float32)
+    labels = GAZE360.encode(cont_labels)
+
+    def per_sample(batch):
+        flipped = [augmentation(image, label[0]) for image, label in zip(images, cont_labels)]
+        torch.from_numpy(np.stack([image for image, _ in flipped])).to(gpu)
+
+    augment = BatchAugment(GAZE360, yaw_column=0, flip=1.0, crop=0, brightness=0, contrast=0, saturation=0)
+    jitter = BatchAugment(GAZE360, yaw_column=0)
+    batch = torch.from_numpy(images).permute(0, 3, 1, 2).contiguous().to(gpu)
+    batch_labels, batch_cont = torch.from_numpy(labels).to(gpu), torch.from_numpy(cont_labels).to(gpu)
+
+    report('per-sample flip (per batch)', time_frames(per_sample, [None] * args.frames, args.warmup))
+    report('batched flip (per batch)',
+           time_frames(lambda _: augment(batch, batch_labels, batch_cont), [None] * args.frames, args.warmup))
+    report('batched flip+crop+jitter',
+           time_frames(lambda _: jitter(batch, batch_labels, batch_cont), [None] * args.frames, args.warmup))
+
+    # the batched flip must give the flipped images and the bins of the negated yaw
+    flipped, flipped_labels, flipped_cont = augment(batch, batch_labels, batch_cont)
+    expected = BatchAugment(GAZE360, flip=0, crop=0, brightness=0, contrast=0, saturation=0)(
+        batch.flip(3), batch_labels, batch_cont)[0]
+    print('max image difference to the per-sample flip: {:.2e}'.format((flipped - expected).abs().max().item()))
+    print('bins differing from the negated yaw: {}'.format(
+        int((flipped_labels[:, 0].cpu().numpy() != GAZE360.encode(-cont_labels[:, 0])).sum())))
+
+
+def bench_amp(args):
+    """Training steps in fp32 vs --amp from the same weights: step time, peak memory and final angular error."""
+    gpu = select_device(args.gpu_id, batch_size=args.batch_size)
+    torch.manual_seed(0)
+    initial = getArch(args.arch, 90).state_dict()
+    images = torch.randn(args.batch_size, 3, 448, 448, device=gpu)
+    cont_labels = torch.empty(args.batch_size, 2).uniform_(-40, 40).to(gpu)
+    labels = GAZE360.encode_tensor(cont_labels)
+    criterion = torch.nn.CrossEntropyLoss()
+    reg_criterion = torch.nn.MSELoss()
+
+    for name, enabled in [('fp32', False), ('amp', True)]:
+        model = getArch(args.arch, 90)
+        model.load_state_dict(initial)
+        model.to(gpu).train()
+        amp = MixedPrecision(enabled, gpu)
+        optimizer = torch.optim.Adam(model.parameters(), 1e-5)
+
+        def train_step(_):
+            heads = amp.forward(model, images)
+            losses = [criterion(head, labels[:, i]) + reg_criterion(GAZE360.decode(head), cont_labels[:, i])
+                      for i, head in enumerate(heads)]
+            amp.step(optimizer, losses)
+
+        if gpu.type == 'cuda':
+            torch.cuda.reset_peak_memory_stats(gpu)
+        latencies = time_frames(train_step, [None] * args.frames, args.warmup)
+        memory = '{:.0f} MB'.format(torch.cuda.max_memory_allocated(gpu) / 2 ** 20) if gpu.type == 'cuda' else 'n/a'
+        model.eval()
+        with torch.no_grad():
+            gaze = torch.stack([GAZE360.decode(head) for head in amp.forward(model, images)], 1)
+        stats = summarize(angular_errors(gaze * np.pi / 180, cont_labels * np.pi / 180))
+        print('{:<5} {:8.2f} ms per step  peak memory {:>8}  angular error after {} steps {:.2f} deg'.format(
+            name, latencies.mean(), memory, args.frames + args.warmup, stats['mean']))
+
+
+def bench_checkpoint(args):
+    """Time the training thread spends per checkpoint: torch.save vs CheckpointWriter (keep_last=2)."""
+    import tempfile
+    gpu = select_device(args.gpu_id, batch_size=args.batch_size)
+    model = getArch(args.arch, 90).to(gpu)
+    with tempfile.TemporaryDirectory() as folder:
+        def sync_save(i):
+            torch.save(model.state_dict(), os.path.join(folder, 'sync_{}.pkl'.format(i)))
+
+        writer = CheckpointWriter(keep_last=2)
+
+        def async_save(i):
+            writer.save(model.state_dict(), os.path.join(folder, 'async_{}.pkl'.format(i)), retain=True)
+
+        report('torch.save (blocking)', time_frames(sync_save, list(range(args.frames)), args.warmup))
+        report('CheckpointWriter (blocking)', time_frames(async_save, list(range(args.frames)), args.warmup))
+        start = time.perf_counter()
+        writer.close()
+        print('background writes finished {:.2f} s after the last save; {} async snapshots kept'.format(
+            time.perf_counter() - start, len([name for name in os.listdir(folder) if name.startswith('async')])))
+
+
+def bench_loader(args):
+    """Samples/s of the training loader alone, previous settings vs make_loader, --frames batches per epoch."""
+    gpu = select_device(args.gpu_id, batch_size=args.batch_size)
+    dataset = build_datasets(load_config(args.config))[0]
+    loaders = [('num_workers=4 (train scripts)', DataLoader(dataset, batch_size=args.batch_size, shuffle=True,
+                                                           num_workers=4, pin_memory=True)),
+               ('make_loader ({} workers)'.format(worker_count()),
+                make_loader(dataset, args.batch_size, shuffle=True, device=gpu))]
+    for name, loader in loaders:
+        rates = []
+        for epoch in range(args.epochs):
+            # worker start-up included, as every epoch of a training run pays it without persistent workers
+            start = time.perf_counter()
+            samples = 0
+            for i, batch in enumerate(loader):
+                if i == args.frames:
+                    break
+                images = batch[0].to(gpu, non_blocking=True)
+                samples += images.shape[0]
+            if gpu.type == 'cuda':
+                torch.cuda.synchronize()
+            rates.append(samples / (time.perf_counter() - start))
+        print('{:<32} {} samples/s per epoch'.format(name, '  '.join('{:8.1f}'.format(rate) for rate in rates)))
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.mode == 'loader':
+        bench_loader(args)
+        raise SystemExit
+    if args.mode == 'checkpoint':
+        bench_checkpoint(args)
+        raise SystemExit
+    if args.mode == 'amp':
+        bench_amp(args)
+        raise SystemExit
+    if args.mode == 'augment':
+        bench_augment(args)
+        raise SystemExit
+    if args.mode == 'labels':
+        bench_labels(args)
+        raise SystemExit
+    if args.mode == 'cpu':
+        bench_cpu(args)
+        raise SystemExit
+    if args.mode == 'model':
+        bench_model(args)
+        raise SystemExit
+
+    frames = load_frames(args.source, args.frames)
+    print('Benchmark {} on {} frames of {}'.format(args.mode, len(frames), args.source))
+
+    if args.mode == 'pipeline':
+        bench_pipeline(args, frames)
+    elif args.mode == 'faces':
+        bench_faces(args, frames)
+    elif args.mode == 'preprocess':
+        bench_preprocess(args, frames)
+    else:
+        raise ValueError('Unknown benchmark mode {}'.format(args.mode))
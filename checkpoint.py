@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+
+import torch
+
+"""
+                                    ----------------------------------------------------------
+ Background checkpoint writer. save() copies the tensors of a state dict to the CPU on the training thread (the only
+ part that has to wait for the device) and a worker thread writes the file under a temporary name renamed into place,
+ so a crash never leaves a truncated snapshot and the training steps do not wait for the disk.
+
+ Retention: the snapshots saved with retain=True (the _epoch_N.pkl files) are deleted oldest first beyond keep_last,
+ except the one marked with mark_best(). keep_last=0 keeps all of them, as the train scripts did.
+
+     writer = CheckpointWriter(keep_last=5)
+     writer.save(model.state_dict(), output + '/_epoch_3.pkl', retain=True)
+     writer.mark_best(output + '/_epoch_3.pkl')
+     writer.save(state, 'checkpoint/latest_model.pth')
+     writer.close()
+"""
+
+
+def to_cpu(state):
+    """Copy of the tensors of a (nested) state dict on the CPU, safe to write while training goes on."""
+    if torch.is_tensor(state):
+        return state.detach().to('cpu', copy=True)
+    if isinstance(state, dict):
+        return type(state)((key, to_cpu(value)) for key, value in state.items())
+    if isinstance(state, (list, tuple)):
+        return type(state)(to_cpu(value) for value in state)
+    return state
+
+
+def atomic_save(state, path):
+    """torch.save to a temporary file in the same folder, then renamed to path."""
+    folder = os.path.dirname(path)
+    if folder and not os.path.isdir(folder):
+        os.makedirs(folder, exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+class CheckpointWriter():
+    """
+    Writes checkpoints on a worker thread, at most max_pending of them waiting in memory
+    """
+    def __init__(self, keep_last=0, max_pending=2, retained=()):
+        self.keep_last = keep_last
+        # snapshots already on disk from a resumed run, oldest first
+        self.retained = list(retained)
+        self.best = None
+        self.error = None
+        self.writes = queue.Queue(maxsize=max_pending)
+        self.worker = threading.Thread(target=self.write_loop, daemon=True)
+        self.worker.start()
+
+    def check(self):
+        # errors of the worker are raised on the training thread
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def save(self, state, path, retain=False):
+        """Queue state to be written to path; blocks only when max_pending writes are already waiting."""
+        self.check()
+        self.writes.put(('save', to_cpu(state), path, retain))
+
+    def mark_best(self, path):
+        """Protect the retained snapshot path from deletion (the previous best can be deleted again)."""
+        self.writes.put(('best', None, path, False))
+
+    def write_loop(self):
+        while True:
+            item = self.writes.get()
+            try:
+                if item is None:
+                    break
+                action, state, path, retain = item
+                if action == 'best':
+                    self.best = path
+                    self.prune()
+                    continue
+                atomic_save(state, path)
+                if retain:
+                    if path in self.retained:
+                        self.retained.remove(path)
+                    self.retained.append(path)
+                    self.prune()
+            except Exception as e:
+                self.error = e
+            finally:
+                self.writes.task_done()
+
+    def prune(self):
+        if not self.keep_last:
+            return
+        removable = [path for path in self.retained[:-self.keep_last] if path != self.best]
+        for path in removable:
+            if os.path.exists(path):
+                os.remove(path)
+            self.retained.remove(path)
+
+    def flush(self):
+        """Wait for the queued checkpoints to be written."""
+        self.writes.join()
+        self.check()
+
+    def close(self):
+        self.flush()
+        self.writes.put(None)
+        self.worker.join()
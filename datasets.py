@@ -8,6 +8,9 @@ from torch.utils.data.dataset import Dataset
 from torchvision import transforms
 from PIL import Image, ImageFilter
 
+from annotations import load_index, parse_gaze360, parse_mpiigaze
+from labels import BinLayout, MPIIGAZE, encode_labels
+
 
 class Gaze360(Dataset):
     def __init__(self, path, root, transform, angle, binwidth, train=True):
@@ -18,45 +21,26 @@ class Gaze360(Dataset):
         if train==False:
           angle=90
         self.binwidth=binwidth
-        self.lines = []
         if isinstance(path, list):
-            for i in path:
-                with open(i) as f:
-                    print("here")
-                    line = f.readlines()
-                    line.pop(0)
-                    self.lines.extend(line)
+            self.index = load_index(path, parse_gaze360)
+            self.orig_list_len = len(self.index)
         else:
-            with open(path) as f:
-                lines = f.readlines()
-                lines.pop(0)
-                self.orig_list_len = len(lines)
-                for line in lines:
-                    gaze2d = line.strip().split(" ")[5]
-                    label = np.array(gaze2d.split(",")).astype("float")
-                    if abs((label[0]*180/np.pi)) <= angle and abs((label[1]*180/np.pi)) <= angle:
-                        self.lines.append(line)
-                    
+            index = load_index(path, parse_gaze360)
+            self.orig_list_len = len(index)
+            degrees = np.abs(index['gaze']*180/np.pi)
+            self.index = index[(degrees <= angle).all(1)]
+        # continuous labels in degrees and their bins, computed once for the whole dataset
+        self.layout = BinLayout(self.angle, self.binwidth)
+        self.cont_labels, self.labels = encode_labels(self.index['gaze'], self.layout)
                         
-        print("{} items removed from dataset that have an angle > {}".format(self.orig_list_len-len(self.lines), angle))
+        print("{} items removed from dataset that have an angle > {}".format(self.orig_list_len-len(self.index), angle))
 
     def __len__(self):
-        return len(self.lines)
+        return len(self.index)
 
     def __getitem__(self, idx):
-        line = self.lines[idx]
-        line = line.strip().split(" ")
-
-        face = line[0]
-        lefteye = line[1]
-        righteye = line[2]
-        name = line[3]
-        gaze2d = line[5]
-        label = np.array(gaze2d.split(",")).astype("float")
-        label = torch.from_numpy(label).type(torch.FloatTensor)
-
-        pitch = label[0]* 180 / np.pi
-        yaw = label[1]* 180 / np.pi
+        face = self.index['face'][idx]
+        name = str(self.index['name'][idx])
 
         img = Image.open(os.path.join(self.root, face))
 
@@ -68,12 +52,8 @@ class Gaze360(Dataset):
         if self.transform:
             img = self.transform(img)        
         
-        # Bin values
-        bins = np.array(range(-1*self.angle, self.angle, self.binwidth))
-        binned_pose = np.digitize([pitch, yaw], bins) - 1
-
-        labels = binned_pose
-        cont_labels = torch.FloatTensor([pitch, yaw])
+        labels = self.labels[idx]
+        cont_labels = torch.tensor(self.cont_labels[idx])
         
 
         return img, labels, cont_labels, name
@@ -83,56 +63,29 @@ class Mpiigaze(Dataset):
     self.transform = transform
     self.root = root
     self.orig_list_len = 0
-    self.lines = []
     path=pathorg.copy()
     if train==True:
       path.pop(fold)
+      angle_max=angle
     else:
+      # held-out subject
       path=path[fold]
-    if isinstance(path, list):
-        for i in path:
-            with open(i) as f:
-                lines = f.readlines()
-                lines.pop(0)
-                self.orig_list_len += len(lines)
-                for line in lines:
-                    gaze2d = line.strip().split(" ")[7]
-                    label = np.array(gaze2d.split(",")).astype("float")
-                    if abs((label[0]*180/np.pi)) <= angle and abs((label[1]*180/np.pi)) <= angle:
-                        self.lines.append(line)
-    else:
-      with open(path) as f:
-        lines = f.readlines()
-        lines.pop(0)
-        self.orig_list_len += len(lines)
-        for line in lines:
-            gaze2d = line.strip().split(" ")[7]
-            label = np.array(gaze2d.split(",")).astype("float")
-            if abs((label[0]*180/np.pi)) <= 42 and abs((label[1]*180/np.pi)) <= 42:
-                self.lines.append(line)
+      angle_max=42
+    index = load_index(path, parse_mpiigaze)
+    self.orig_list_len = len(index)
+    degrees = np.abs(index['gaze']*180/np.pi)
+    self.index = index[(degrees <= angle_max).all(1)]
+    self.layout = MPIIGAZE
+    self.cont_labels, self.labels = encode_labels(self.index['gaze'], self.layout)
    
-    print("{} items removed from dataset that have an angle > {}".format(self.orig_list_len-len(self.lines),angle))
+    print("{} items removed from dataset that have an angle > {}".format(self.orig_list_len-len(self.index),angle))
         
   def __len__(self):
-    return len(self.lines)
+    return len(self.index)
 
   def __getitem__(self, idx):
-    line = self.lines[idx]
-    line = line.strip().split(" ")
-
-    name = line[3]
-    gaze2d = line[7]
-    head2d = line[8]
-    lefteye = line[1]
-    righteye = line[2]
-    face = line[0]
-
-    label = np.array(gaze2d.split(",")).astype("float")
-    label = torch.from_numpy(label).type(torch.FloatTensor)
-
-
-    pitch = label[0]* 180 / np.pi
-    yaw = label[1]* 180 / np.pi
+    face = self.index['face'][idx]
+    name = str(self.index['name'][idx])
 
     img = Image.open(os.path.join(self.root, face))
 
@@ -144,12 +97,8 @@ class Mpiigaze(Dataset):
     if self.transform:
         img = self.transform(img)        
     
-    # Bin values
-    bins = np.array(range(-42, 42,3))
-    binned_pose = np.digitize([pitch, yaw], bins) - 1
-
-    labels = binned_pose
-    cont_labels = torch.FloatTensor([pitch, yaw])
+    labels = self.labels[idx]
+    cont_labels = torch.tensor(self.cont_labels[idx])
 
 
     return img, labels, cont_labels, name
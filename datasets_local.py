@@ -4,158 +4,16 @@ import random
 import numpy as np
 import cv2
 
-from utils import augmentation
 import torch
 from torch.utils.data.dataset import Dataset
 from torchvision import transforms
 from PIL import Image, ImageFilter
 
-
-class Gaze360(Dataset):
-    def __init__(self, path, root, transform, angle, binwidth, train=True):
-        self.transform = transform
-        self.root = root
-        self.orig_list_len = 0
-        self.angle = angle
-        if train==False:
-          angle=90
-        self.binwidth=binwidth
-        self.lines = []
-        if isinstance(path, list):
-            for i in path:
-                with open(i) as f:
-                    print("here")
-                    line = f.readlines()
-                    line.pop(0)
-                    self.lines.extend(line)
-        else:
-            with open(path) as f:
-                lines = f.readlines()
-                lines.pop(0)
-                self.orig_list_len = len(lines)
-                for line in lines:
-                    gaze2d = line.strip().split(" ")[5]
-                    label = np.array(gaze2d.split(",")).astype("float")
-                    if abs((label[0]*180/np.pi)) <= angle and abs((label[1]*180/np.pi)) <= angle:
-                        self.lines.append(line)
-                    
-                        
-        print("{} items removed from dataset that have an angle > {}".format(self.orig_list_len-len(self.lines), angle))
-
-    def __len__(self):
-        return len(self.lines)
-
-    def __getitem__(self, idx):
-        line = self.lines[idx]
-        line = line.strip().split(" ")
-
-        face = line[0]
-        lefteye = line[1]
-        righteye = line[2]
-        name = line[3]
-        gaze2d = line[5]
-        label = np.array(gaze2d.split(",")).astype("float")
-        label = torch.from_numpy(label).type(torch.FloatTensor)
-
-        pitch = label[0]* 180 / np.pi
-        yaw = label[1]* 180 / np.pi
-
-        img = Image.open(os.path.join(self.root, face))
-
-        # fimg = cv2.imread(os.path.join(self.root, face))
-        # fimg = cv2.resize(fimg, (448, 448))/255.0
-        # fimg = fimg.transpose(2, 0, 1)
-        # img=torch.from_numpy(fimg).type(torch.FloatTensor)
-
-        if self.transform:
-            img = self.transform(img)        
-
-
-        # Bin values
-        bins = np.array(range(-1*self.angle, self.angle, self.binwidth))
-        binned_pose = np.digitize([pitch, yaw], bins) - 1
-
-        labels = binned_pose
-        cont_labels = torch.FloatTensor([pitch, yaw])
-        return img, labels, cont_labels, name
-
-
-
-class Mpiigaze(Dataset): 
-  def __init__(self, pathorg, root, transform, train, angle,fold=0):
-    self.transform = transform
-    self.root = root
-    self.orig_list_len = 0
-    self.lines = []
-    path=pathorg.copy()
-    if train==True:
-      path.pop(fold)
-    else:
-      path=path[fold]
-    if isinstance(path, list):
-        for i in path:
-            with open(i) as f:
-                lines = f.readlines()
-                lines.pop(0)
-                self.orig_list_len += len(lines)
-                for line in lines:
-                    gaze2d = line.strip().split(" ")[7]
-                    label = np.array(gaze2d.split(",")).astype("float")
-                    if abs((label[0]*180/np.pi)) <= angle and abs((label[1]*180/np.pi)) <= angle:
-                        self.lines.append(line)
-    else:
-      with open(path) as f:
-        lines = f.readlines()
-        lines.pop(0)
-        self.orig_list_len += len(lines)
-        for line in lines:
-            gaze2d = line.strip().split(" ")[7]
-            label = np.array(gaze2d.split(",")).astype("float")
-            if abs((label[0]*180/np.pi)) <= 42 and abs((label[1]*180/np.pi)) <= 42:
-                self.lines.append(line)
-   
-    print("{} items removed from dataset that have an angle > {}".format(self.orig_list_len-len(self.lines),angle))
-        
-  def __len__(self):
-    return len(self.lines)
-
-  def __getitem__(self, idx):
-    line = self.lines[idx]
-    line = line.strip().split(" ")
-
-    name = line[3]
-    gaze2d = line[7]
-    head2d = line[8]
-    lefteye = line[1]
-    righteye = line[2]
-    face = line[0]
-
-    label = np.array(gaze2d.split(",")).astype("float")
-    label = torch.from_numpy(label).type(torch.FloatTensor)
-
-
-    pitch = label[0]* 180 / np.pi
-    yaw = label[1]* 180 / np.pi
-
-    img = Image.open(os.path.join(self.root, face))
-
-    # fimg = cv2.imread(os.path.join(self.root, face))
-    # fimg = cv2.resize(fimg, (448, 448))/255.0
-    # fimg = fimg.transpose(2, 0, 1)
-    # img=torch.from_numpy(fimg).type(torch.FloatTensor)
-    
-    if self.transform:
-        img = self.transform(img)        
-    
-    # Bin values
-    bins = np.array(range(-42, 42,3))
-    binned_pose = np.digitize([pitch, yaw], bins) - 1
-
-    labels = binned_pose
-    cont_labels = torch.FloatTensor([pitch, yaw])
-
-
-    return img, labels, cont_labels, name
+from annotations import load_index, csv_parser
+from labels import LAYOUTS, encode_labels
+from manifest import load_manifest
+# Gaze360 and MPIIGaze are read exactly as in datasets.py
+from datasets import Gaze360, Mpiigaze
 
 
 # annotation columns for socialAI dataset: 'dotNr','corrResp', 'fName',
@@ -166,7 +24,18 @@ class Mpiigaze(Dataset):
 # facepaths: headcrop2/image_name
 
 class SocialAI(Dataset):
-    def __init__(self, transform, binwidth = 3 , high_res = False, train=True, training_val = True, distances = [1,2,3]):
+    # annotation files and position of the columns used in their rows (negative positions count from the end)
+    train_file = "datasets/SocialAI/annotation_train.csv"
+    test_file = "datasets/SocialAI/annotation_test.csv"
+    train_columns = {'yaw': (-5, np.float64), 'pitch': (-4, np.float64), 'distance': (-3, np.int64),
+                     'path': (-2, str), 'training_val': (-1, str), 'high_res': (1, str)}
+    test_columns = {'yaw': (-4, np.float64), 'pitch': (-3, np.float64), 'distance': (-2, np.int64),
+                    'path': (-1, str)}
+    # keep the rows whose training_val column differs from training_val instead of the equal ones
+    exclude_training_val = False
+
+    def __init__(self, transform, layout = LAYOUTS['socialai'], high_res = False, train=True, training_val = True, distances = [1,2,3],
+                 rebuild_manifest = False, manifest_threads = 16):
         self.transform = transform
         self.root = "datasets/SocialAI/"
         self.training_val = str(training_val)
@@ -174,90 +43,40 @@ class SocialAI(Dataset):
         self.train = str(train)
         self.distances = distances # 1,2,3 need to be an array
         self.high_res = str(high_res)
-        # self.angle = angle
-        self.binwidth = binwidth
-        self.lines = []
-        # path = pathorg.copy()
-        # if train==True:
-        #     path.pop(fold)
-        # else:
-        #     path=path[fold]
+        self.layout = layout
 
         if self.train == "True":
-            with open("datasets/SocialAI/annotation_train.csv") as f:
-                lines = f.read().splitlines()
-                lines.pop(0)
-                self.orig_list_len = len(lines)
-                for line in lines:
-                    # if line.split(",")[-2] == self.train and line.split(",")[3] == self.high_res and int(line.split(",")[-1]) in self.rows:
-                    high_res_line = line.split(",")[1]
-                    if self.high_res == "True":
-                        high_res_line = "True"
-                    if line.split(",")[-1] == self.training_val and int(line.split(",")[-3]) in self.distances and high_res_line == self.high_res:
-                        if abs(np.double(line.split(",")[-4])*180/np.pi) <= 60 and abs(np.double(line.split(",")[-5])*180/np.pi) <= 60:
-                          self.lines.append(line)
-                print(len(self.lines))
+            index = load_index(self.train_file, csv_parser(self.train_columns))
+            keep = np.isin(index['distance'], self.distances)
+            if self.exclude_training_val:
+                keep &= index['training_val'] != self.training_val
+            else:
+                keep &= index['training_val'] == self.training_val
+            if self.high_res != "True":
+                keep &= index['high_res'] == self.high_res
         else:
-            with open("datasets/SocialAI/annotation_test.csv") as f:
-                lines = f.read().splitlines()
-                lines.pop(0)
-                self.orig_list_len = len(lines)
-                for line in lines:
-                    # if line.split(",")[-2] == self.train and line.split(",")[3] == self.high_res and int(line.split(",")[-1]) in self.rows:
-                    if int(line.split(",")[-2]) in self.distances:
-                        if abs(np.double(line.split(",")[-3])*180/np.pi) <= 60 and abs(np.double(line.split(",")[-4])*180/np.pi) <= 60:
-                          self.lines.append(line)
+            index = load_index(self.test_file, csv_parser(self.test_columns))
+            keep = np.isin(index['distance'], self.distances)
+        self.orig_list_len = len(index)
+        keep &= (np.abs(index['pitch']*180/np.pi) <= 60) & (np.abs(index['yaw']*180/np.pi) <= 60)
+        index = index[keep]
+        # only the images that exist and can be read, checked once and saved in the manifest
+        self.index = index[load_manifest(self.root, index['path'], threads=manifest_threads, rebuild=rebuild_manifest)]
+        # labels in (yaw, pitch) column order, in degrees and binned once for the whole dataset
+        self.cont_labels, self.labels = encode_labels(np.stack([self.index['yaw'], self.index['pitch']], 1), self.layout)
+        if self.train == "True":
+            print(len(self.index))
 
     def __len__(self):
-        return len(self.lines)
+        return len(self.index)
 
     def __getitem__(self, idx):
-        var = True
-        if self.train == "True":
-            while var:
-                line = self.lines[idx]
-
-                pitch = np.double(line.split(",")[-4])
-                yaw = np.double(line.split(",")[-5])
-
-                face_path = line.split(",")[-2]
-                try:
-                    img = Image.open(os.path.join(self.root, face_path))
-                    var = False
-                except:
-                    idx = idx - 1
-        else:
-            while var:
-                line = self.lines[idx]
-
-                pitch = np.double(line.split(",")[-3])
-                yaw = np.double(line.split(",")[-4])
-
-                face_path = line.split(",")[-1]
-                try:
-                    img = Image.open(os.path.join(self.root, face_path))
-                    var = False
-                except:
-                    idx = idx - 1
+        face_path = self.index['path'][idx]
+        img = Image.open(os.path.join(self.root, face_path))
 
         if self.transform:
             img = self.transform(img)
 
-            # label = [np.double(el) for el in line.split('"')[1].split(",")]  # yaw, pitch
-        label = np.array([np.double(yaw), np.double(pitch)])
-        # name = line[3]
-        # gaze2d = line[7]
-        # head2d = line[8]
-        # lefteye = line[1]
-        # righteye = line[2]
-        # face = line[0]
-
-        # label = np.array(gaze2d.split(",")).astype("float")
-        label = torch.from_numpy(label).type(torch.FloatTensor) # rad
-
-        pitch = label[0] * 180 / np.pi
-        yaw = label[1] * 180 / np.pi
-        
         img = np.array(img)
         # print(img.shape)
         # img = np.moveaxis(img, -1, 0)
@@ -276,13 +95,7 @@ class SocialAI(Dataset):
         img=torch.from_numpy(img).type(torch.FloatTensor)
         # print(img.shape)
 
-        # Bin values
-        angle = 180
-        bins = np.array(range(-angle, angle, self.binwidth))
-        binned_pose = np.digitize([pitch, yaw], bins) - 1
-
-        labels = binned_pose
-        cont_labels = torch.FloatTensor([pitch, yaw])
+        labels = self.labels[idx]
+        cont_labels = torch.tensor(self.cont_labels[idx])
 
         return img, labels, cont_labels
-
@@ -3,19 +3,8 @@ import numpy as np
 import cv2
 import time
 
-import torch
-import torch.nn as nn
-from torch.autograd import Variable
-from torchvision import transforms
-import torch.backends.cudnn as cudnn
-import torchvision
-
-from PIL import Image
-from utils import select_device, draw_gaze
-from PIL import Image, ImageOps
-
-from face_detection import RetinaFace
-from model import L2CS
+from utils import draw_gaze
+from pipeline import GazePipeline
 
 
 def parse_args():
@@ -23,7 +12,7 @@ def parse_args():
     parser = argparse.ArgumentParser(
         description='Gaze evalution using model pretrained with L2CS-Net on Gaze360.')
     parser.add_argument(
-        '--gpu',dest='gpu_id', help='GPU device id to use [0]',
+        '--gpu', '--device', dest='gpu_id', help='GPU device id to use [0] or cpu',
         default="0", type=str)
     parser.add_argument(
         '--snapshot',dest='snapshot', help='Path of model snapshot.', 
@@ -34,61 +23,28 @@ def parse_args():
     parser.add_argument(
         '--arch',dest='arch',help='Network architecture, can be: ResNet18, ResNet34, ResNet50, ResNet101, ResNet152',
         default='ResNet50', type=str)
+    parser.add_argument(
+        '--threads', dest='threads', help='Intra-op CPU threads [torch default]',
+        default=None, type=int)
+    parser.add_argument(
+        '--interop_threads', dest='interop_threads', help='Inter-op CPU threads [torch default]',
+        default=None, type=int)
+    parser.add_argument(
+        '--channels_last', dest='channels_last', help='Run the model in channels_last memory format',
+        action='store_true')
+    parser.add_argument(
+        '--max_faces',dest='max_faces',help='Maximum number of faces processed per frame, the most confident first [all]',
+        default=None, type=int)
 
     args = parser.parse_args()
     return args
 
-def getArch(arch,bins):
-    # Base network structure
-    if arch == 'ResNet18':
-        model = L2CS( torchvision.models.resnet.BasicBlock,[2, 2,  2, 2], bins)
-    elif arch == 'ResNet34':
-        model = L2CS( torchvision.models.resnet.BasicBlock,[3, 4,  6, 3], bins)
-    elif arch == 'ResNet101':
-        model = L2CS( torchvision.models.resnet.Bottleneck,[3, 4, 23, 3], bins)
-    elif arch == 'ResNet152':
-        model = L2CS( torchvision.models.resnet.Bottleneck,[3, 8, 36, 3], bins)
-    else:
-        if arch != 'ResNet50':
-            print('Invalid value for architecture is passed! '
-                'The default value of ResNet50 will be used instead!')
-        model = L2CS( torchvision.models.resnet.Bottleneck, [3, 4, 6,  3], bins)
-    return model
-
 if __name__ == '__main__':
     args = parse_args()
 
-    cudnn.enabled = True
-    arch=args.arch
-    batch_size = 1
     cam = args.cam_id
-    gpu = select_device(args.gpu_id, batch_size=batch_size)
-    snapshot_path = args.snapshot
-   
-    
-
-    transformations = transforms.Compose([
-        transforms.Resize(448),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        )
-    ])
-    
-    model=getArch(arch, 90)
-    print('Loading snapshot.')
-    saved_state_dict = torch.load(snapshot_path)
-    model.load_state_dict(saved_state_dict)
-    model.cuda(gpu)
-    model.eval()
-
-
-    softmax = nn.Softmax(dim=1)
-    detector = RetinaFace(gpu_id=0)
-    idx_tensor = [idx for idx in range(90)]
-    idx_tensor = torch.FloatTensor(idx_tensor).cuda(gpu)
-    x=0
+    pipeline = GazePipeline(args.snapshot, arch=args.arch, gpu_id=args.gpu_id, threads=args.threads,
+                            interop_threads=args.interop_threads, channels_last=args.channels_last, max_faces=args.max_faces)
   
     cap = cv2.VideoCapture(cam)
 
@@ -96,65 +52,21 @@ if __name__ == '__main__':
     if not cap.isOpened():
         raise IOError("Cannot open webcam")
 
-    with torch.no_grad():
-        while True:
-            success, frame = cap.read()    
-            start_fps = time.time()  
-           
-            faces = detector(frame)
-            if faces is not None: 
-                for box, landmarks, score in faces:
-                    if score < .95:
-                        continue
-                    x_min=int(box[0])
-                    if x_min < 0:
-                        x_min = 0
-                    y_min=int(box[1])
-                    if y_min < 0:
-                        y_min = 0
-                    x_max=int(box[2])
-                    y_max=int(box[3])
-                    bbox_width = x_max - x_min
-                    bbox_height = y_max - y_min
-                    # x_min = max(0,x_min-int(0.2*bbox_height))
-                    # y_min = max(0,y_min-int(0.2*bbox_width))
-                    # x_max = x_max+int(0.2*bbox_height)
-                    # y_max = y_max+int(0.2*bbox_width)
-                    # bbox_width = x_max - x_min
-                    # bbox_height = y_max - y_min
-
-                    # Crop image
-                    img = frame[y_min:y_max, x_min:x_max]
-                    img = cv2.resize(img, (224, 224))
-                    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-                    im_pil = Image.fromarray(img)
-                    img=transformations(im_pil)
-                    img  = Variable(img).cuda(gpu)
-                    img  = img.unsqueeze(0) 
-                    
-                    # gaze prediction
-                    gaze_pitch, gaze_yaw = model(img)
-                    
-                    
-                    pitch_predicted = softmax(gaze_pitch)
-                    yaw_predicted = softmax(gaze_yaw)
-                    
-                    # Get continuous predictions in degrees.
-                    pitch_predicted = torch.sum(pitch_predicted.data[0] * idx_tensor) * 4 - 180
-                    yaw_predicted = torch.sum(yaw_predicted.data[0] * idx_tensor) * 4 - 180
-                    
-                    pitch_predicted= pitch_predicted.cpu().detach().numpy()* np.pi/180.0
-                    yaw_predicted= yaw_predicted.cpu().detach().numpy()* np.pi/180.0
-
-                
-                    
-                    draw_gaze(x_min,y_min,bbox_width, bbox_height,frame,(pitch_predicted,yaw_predicted),color=(0,0,255))
-                    cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0,255,0), 1)
-            myFPS = 1.0 / (time.time() - start_fps)
-            cv2.putText(frame, 'FPS: {:.1f}'.format(myFPS), (10, 20),cv2.FONT_HERSHEY_COMPLEX_SMALL, 1, (0, 255, 0), 1, cv2.LINE_AA)
-
-            cv2.imshow("Demo",frame)
-            if cv2.waitKey(1) & 0xFF == 27:
-                break
-            success,frame = cap.read()  
-    
\ No newline at end of file
+    while True:
+        success, frame = cap.read()    
+        start_fps = time.time()  
+
+        bboxes, scores, yaw, pitch = pipeline.predict(frame)
+        for (x_min, y_min, x_max, y_max), yaw_predicted, pitch_predicted in zip(bboxes, yaw, pitch):
+            bbox_width = x_max - x_min
+            bbox_height = y_max - y_min
+            draw_gaze(x_min,y_min,bbox_width, bbox_height,frame,(yaw_predicted,pitch_predicted),color=(0,0,255))
+            cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0,255,0), 1)
+        myFPS = 1.0 / (time.time() - start_fps)
+        cv2.putText(frame, 'FPS: {:.1f}'.format(myFPS), (10, 20),cv2.FONT_HERSHEY_COMPLEX_SMALL, 1, (0, 255, 0), 1, cv2.LINE_AA)
+
+        cv2.imshow("Demo",frame)
+        if cv2.waitKey(1) & 0xFF == 27:
+            break
+        success,frame = cap.read()  
+    
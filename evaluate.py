@@ -0,0 +1,315 @@
+import os, argparse
+import time
+import json
+import hashlib
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import torch
+from torch.utils.data import DataLoader
+from torchvision import transforms
+import torch.backends.cudnn as cudnn
+
+import datasets
+from utils import select_device, natural_keys, getArch, set_cpu_threads
+from preprocess import normalize_batch
+from metrics import AngularErrorMeter
+from labels import GAZE360, MPIIGAZE
+
+"""
+                                    ----------------------------------------------------------
+ Evaluation of every snapshot of a training run with a single decoding of the test set.
+ The test images are decoded and resized once into a uint8 tensor, kept in RAM or written to a memory-mapped .npy
+ file (--cache) that later runs reuse, then every checkpoint streams that tensor; the normalization is done per
+ batch on the device. --jobs evaluates several checkpoints concurrently.
+ The outputs are the same as the gaze360 branch of test.py: <evalpath>/gaze360.log and gaze360.png.
+
+ For MPIIGaze the 15 leave-one-out folds are evaluated in parallel processes (--jobs, sequential with 1 or when no
+ process pool can be started). Every fold writes <evalpath>/foldN/mpiigaze.log/.png as before plus mpiigaze.json
+ with the statistics of each epoch, and the folds are aggregated in memory into <evalpath>/avg.log and
+ results.json (cross-fold mean per epoch and best epoch).
+
+     python evaluate.py --snapshot output/snapshots/L2CS-gaze360-_loader-180-4-lr --cache cache/gaze360_test.npy
+     python evaluate.py --dataset mpiigaze --snapshot output/snapshots/L2CS-mpiigaze --evalpath evaluation/L2CS-mpiigaze --device cpu --jobs 5
+"""
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='Evaluate all the snapshots of a L2CS-Net run on Gaze360 or MPIIGaze.')
+    parser.add_argument(
+        '--gaze360image_dir', dest='gaze360image_dir', help='Directory path for gaze images.',
+        default='datasets/Gaze360/Image', type=str)
+    parser.add_argument(
+        '--gaze360label_dir', dest='gaze360label_dir', help='Directory path for gaze labels.',
+        default='datasets/Gaze360/Label/test.label', type=str)
+    parser.add_argument(
+        '--gazeMpiimage_dir', dest='gazeMpiimage_dir', help='Directory path for gaze images.',
+        default='datasets/MPIIFaceGaze/Image', type=str)
+    parser.add_argument(
+        '--gazeMpiilabel_dir', dest='gazeMpiilabel_dir', help='Directory path for gaze labels.',
+        default='datasets/MPIIFaceGaze/Label', type=str)
+    parser.add_argument(
+        '--dataset', dest='dataset', help='gaze360, mpiigaze',
+        default="gaze360", type=str)
+    parser.add_argument(
+        '--snapshot', dest='snapshot', help='Path to the folder contains models.',
+        default='output/snapshots/L2CS-gaze360-_loader-180-4-lr', type=str)
+    parser.add_argument(
+        '--evalpath', dest='evalpath', help='path for the output evaluating gaze test.',
+        default="evaluation/L2CS-gaze360-_loader-180-4-lr", type=str)
+    parser.add_argument(
+        '--cache', dest='cache', help='Memory-mapped .npy file holding the decoded test set [in RAM if not set]',
+        default=None, type=str)
+    parser.add_argument(
+        '--jobs', dest='jobs', help='Number of checkpoints (gaze360) or folds (mpiigaze) evaluated concurrently.',
+        default=1, type=int)
+    parser.add_argument(
+        '--gpu', '--device', dest='gpu_id', help='GPU device id to use [0] or cpu',
+        default="0", type=str)
+    parser.add_argument(
+        '--batch_size', dest='batch_size', help='Batch size.',
+        default=100, type=int)
+    parser.add_argument(
+        '--arch', dest='arch', help='Network architecture, can be: ResNet18, ResNet34, [ResNet50], ''ResNet101, ResNet152',
+        default='ResNet50', type=str)
+    args = parser.parse_args()
+    return args
+
+
+def dataset_key(dataset):
+    """
+    Hash of what the decoded images of dataset depend on: its class, image root and transform, and its index (the
+    parsed label files after the angle filter), as annotations.load_index keys its cache on the label files.
+    """
+    digest = hashlib.sha1('{}:{}:{}'.format(type(dataset).__name__, os.path.abspath(str(getattr(dataset, 'root', ''))),
+                                            repr(getattr(dataset, 'transform', None))).encode())
+    index = getattr(dataset, 'index', None)
+    if index is not None:
+        digest.update(np.ascontiguousarray(index).tobytes())
+    else:
+        digest.update(str(len(dataset)).encode())
+    return digest.hexdigest()
+
+
+def decode_dataset(dataset, cache=None, batch_size=100, num_workers=4):
+    """
+    Decode a (image, labels, cont_labels, name) dataset returning uint8 images once.
+    Returns images (N, 3, H, W) uint8, as a memory-mapped array if cache is set, and cont_labels (N, 2).
+    The cache is reused only if <cache>_meta.json holds the dataset_key of dataset.
+    """
+    labels_path = None if cache is None else os.path.splitext(cache)[0] + '_labels.npy'
+    meta_path = None if cache is None else os.path.splitext(cache)[0] + '_meta.json'
+    key = None if cache is None else dataset_key(dataset)
+    if cache is not None and all(os.path.exists(path) for path in [cache, labels_path, meta_path]):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        images = np.load(cache, mmap_mode='r')
+        cont_labels = np.load(labels_path)
+        if meta.get('key') == key and len(images) == len(dataset) == len(cont_labels):
+            print('Using the decoded test set of {}'.format(cache))
+            return images, cont_labels
+        print('{} does not match the dataset, decoding again'.format(cache))
+        del images
+    if meta_path is not None and os.path.exists(meta_path):
+        # the cache is about to be overwritten
+        os.remove(meta_path)
+
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    images = None
+    cont_labels = np.zeros((len(dataset), 2), dtype=np.float32)
+    start = 0
+    for batch, _, batch_labels, _ in loader:
+        if images is None:
+            shape = (len(dataset),) + tuple(batch.shape[1:])
+            if cache is None:
+                images = np.empty(shape, dtype=np.uint8)
+            else:
+                if os.path.dirname(cache) and not os.path.exists(os.path.dirname(cache)):
+                    os.makedirs(os.path.dirname(cache))
+                images = np.lib.format.open_memmap(cache, mode='w+', dtype=np.uint8, shape=shape)
+        images[start:start + len(batch)] = batch.numpy()
+        cont_labels[start:start + len(batch)] = batch_labels.numpy()
+        start += len(batch)
+    if cache is not None:
+        images.flush()
+        np.save(labels_path, cont_labels)
+        # written last, so that an interrupted decoding is never reused
+        with open(meta_path, 'w') as f:
+            json.dump({'key': key, 'count': len(dataset), 'dataset': type(dataset).__name__}, f, indent=2)
+    return images, cont_labels
+
+
+def evaluate_snapshot(path, images, cont_labels, arch, gpu, batch_size=100, layout=GAZE360):
+    """Angular error statistics of one snapshot over the decoded test set."""
+    model = getArch(arch, layout.bins, inference=True)
+    model.load_snapshot(torch.load(path, map_location=gpu))
+    model.eval()
+    model.fold_bn()
+    model.to(gpu)
+    meter = AngularErrorMeter()
+    with torch.no_grad():
+        for i in range(0, len(images), batch_size):
+            batch = torch.from_numpy(np.ascontiguousarray(images[i:i + batch_size])).to(gpu)
+            batch = normalize_batch(batch, channels_last=False)
+            gaze_pitch, gaze_yaw = model(batch)
+
+            pitch_predicted = layout.decode(gaze_pitch)
+            yaw_predicted = layout.decode(gaze_yaw)
+            label = torch.from_numpy(cont_labels[i:i + batch_size])
+            meter.update(torch.stack([pitch_predicted, yaw_predicted], 1) * np.pi / 180, label * np.pi / 180)
+    return meter.compute()
+
+
+def evaluate_folder(snapshot_path, evalpath, dataset, data_set, arch, gpu, batch_size=100, cache=None, jobs=1,
+                    layout=GAZE360, name=None):
+    """
+    Evaluate every snapshot of snapshot_path and write <evalpath>/<data_set>.log and .png like test.py.
+    Returns the list of (snapshot, stats) in epoch order.
+    """
+    if not os.path.exists(evalpath):
+        os.makedirs(evalpath)
+    start = time.time()
+    images, cont_labels = decode_dataset(dataset, cache, batch_size)
+    print('Test set decoded in {:.1f} s'.format(time.time() - start))
+
+    # list all epochs for testing
+    folder = os.listdir(snapshot_path)
+    folder.sort(key=natural_keys)
+
+    def run(epochs):
+        return evaluate_snapshot(os.path.join(snapshot_path, epochs), images, cont_labels, arch, gpu, batch_size,
+                                 layout)
+
+    results = []
+    with open(os.path.join(evalpath, data_set + ".log"), 'w') as outfile:
+        configuration = f"\ntest configuration = gpu_id={gpu}, batch_size={batch_size}, model_arch={arch}\nStart testing dataset={name or data_set}----------------------------------------\n"
+        print(configuration)
+        outfile.write(configuration)
+        epoch_list = []
+        avg_MAE = []
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            # map keeps the epoch order, so the log is written as the results come in
+            for epochs, stats in zip(folder, executor.map(run, folder)):
+                x = ''.join(filter(lambda i: i.isdigit(), epochs))
+                epoch_list.append(x)
+                avg_MAE.append(stats['mean'])
+                results.append((epochs, stats))
+                loger = f"[{epochs}---{data_set}] Total Num:{stats['count']},MAE:{stats['mean']}\n"
+                outfile.write(loger)
+                print(loger)
+
+    fig = plt.figure(figsize=(14, 8))
+    plt.xlabel('epoch')
+    plt.ylabel('avg')
+    plt.title('Gaze angular error')
+    plt.plot(epoch_list, avg_MAE, color='k', label='mae')
+    plt.legend()
+    fig.savefig(os.path.join(evalpath, data_set + ".png"), format='png')
+    plt.close(fig)
+    return results
+
+
+def evaluate_fold(fold, snapshot_path, evalpath, label_dir, image_dir, arch, gpu_id, batch_size=100, threads=None):
+    """
+    Evaluate all the epochs of one MPIIGaze leave-one-out fold (snapshot_path/foldN) on its held-out subject.
+    Writes <evalpath>/foldN/mpiigaze.log, .png and .json and returns the content of the json.
+    """
+    matplotlib.use('Agg')
+    set_cpu_threads(threads)
+    gpu = select_device(gpu_id, batch_size=batch_size)
+    folder = sorted(os.listdir(label_dir))
+    testlabelpathombined = [os.path.join(label_dir, j) for j in folder]
+    transformations = transforms.Compose([
+        transforms.Resize((448, 448)),
+        transforms.PILToTensor(),
+    ])
+    gaze_dataset = datasets.Mpiigaze(testlabelpathombined, image_dir, transformations, False, 42, fold)
+
+    fold_path = os.path.join(evalpath, "fold" + str(fold))
+    results = evaluate_folder(os.path.join(snapshot_path, "fold" + str(fold)), fold_path, gaze_dataset, "mpiigaze",
+                              arch, gpu, batch_size, layout=MPIIGAZE,
+                              name="mpiigaze, fold={}".format(fold))
+    fold_results = {
+        'fold': fold,
+        'epochs': [dict(snapshot=epochs, epoch=''.join(filter(lambda i: i.isdigit(), epochs)), **stats)
+                   for epochs, stats in results],
+    }
+    with open(os.path.join(fold_path, "mpiigaze.json"), 'w') as outfile:
+        json.dump(fold_results, outfile, indent=2)
+    return fold_results
+
+
+def evaluate_folds(snapshot_path, evalpath, label_dir, image_dir, arch, gpu_id, batch_size=100, jobs=1, folds=15):
+    """Evaluate the MPIIGaze folds, jobs at a time in separate processes, and return their results in fold order."""
+    jobs = max(1, min(jobs, folds))
+    # CPU threads are shared between the fold processes
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+    arguments = [(fold, snapshot_path, evalpath, label_dir, image_dir, arch, gpu_id, batch_size, threads)
+                 for fold in range(folds)]
+    if jobs > 1:
+        try:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+                futures = [executor.submit(evaluate_fold, *a) for a in arguments]
+                return [future.result() for future in futures]
+        except (OSError, BrokenProcessPool) as e:
+            print('Fold processes could not run ({}), evaluating the folds sequentially.'.format(e))
+    return [evaluate_fold(*a) for a in arguments]
+
+
+def aggregate(fold_results, respath=None):
+    """
+    Cross-fold mean error of every epoch present in all the folds and the best epoch.
+    Writes <respath>/avg.log and results.json if respath is set.
+    """
+    per_epoch = {}
+    for fold in fold_results:
+        for result in fold['epochs']:
+            per_epoch.setdefault(result['epoch'], []).append(result['mean'])
+    epochs = sorted((e for e, errors in per_epoch.items() if len(errors) == len(fold_results)), key=natural_keys)
+    means = {e: float(np.mean(per_epoch[e])) for e in epochs}
+    best = min(epochs, key=lambda e: means[e]) if epochs else None
+    summary = {
+        'folds': len(fold_results),
+        'epochs': [{'epoch': e, 'mean': means[e], 'per_fold': per_epoch[e]} for e in epochs],
+        'best_epoch': best,
+        'best_mean': means[best] if best is not None else None,
+    }
+    if respath is not None:
+        if not os.path.exists(respath):
+            os.makedirs(respath)
+        with open(os.path.join(respath, "avg.log"), 'w') as outfile:
+            outfile.write("Average equal\n")
+            for e in epochs:
+                outfile.write("epoch" + e + "= " + str(means[e]) + "\n")
+            outfile.write("min angular error equal= " + str(summary['best_mean']) + "at epoch= " + str(best) + "\n")
+        with open(os.path.join(respath, "results.json"), 'w') as outfile:
+            json.dump({'summary': summary, 'folds': fold_results}, outfile, indent=2)
+    return summary
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    cudnn.enabled = True
+    if args.dataset == "mpiigaze":
+        fold_results = evaluate_folds(args.snapshot, args.evalpath, args.gazeMpiilabel_dir, args.gazeMpiimage_dir,
+                                      args.arch, args.gpu_id, args.batch_size, args.jobs)
+        summary = aggregate(fold_results, args.evalpath)
+        print("min angular error equal= {} at epoch= {}".format(summary['best_mean'], summary['best_epoch']))
+        raise SystemExit
+    gpu = select_device(args.gpu_id, batch_size=args.batch_size)
+
+    # resize only, the normalization is done per batch on the device
+    transformations = transforms.Compose([
+        transforms.Resize((448, 448)),
+        transforms.PILToTensor(),
+    ])
+    gaze_dataset = datasets.Gaze360(args.gaze360label_dir, args.gaze360image_dir, transformations, 180, 4, train=False)
+    evaluate_folder(args.snapshot, args.evalpath, gaze_dataset, "gaze360", args.arch, gpu,
+                    args.batch_size, args.cache, args.jobs)
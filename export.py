@@ -0,0 +1,105 @@
+import os, argparse
+import numpy as np
+
+import torch
+import torch.nn as nn
+
+from utils import getArch
+from runtime import ExportedGaze
+from labels import LAYOUTS
+
+"""
+                                    ----------------------------------------------------------
+ Export of L2CS together with its decode step (softmax over the bins, expectation, bin width / offset and the
+ conversion to radians) as a single graph, in TorchScript and ONNX with a dynamic batch axis.
+
+     python export.py --snapshot models/L2CSNet_gaze360.pkl --dataset gaze360 --output models/L2CSNet_gaze360
+     -> models/L2CSNet_gaze360.pt, models/L2CSNet_gaze360.onnx, run with runtime.ExportedGaze
+"""
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='Export L2CS-Net with a fused decode head to TorchScript and ONNX.')
+    parser.add_argument(
+        '--snapshot', dest='snapshot', help='Path of model snapshot.',
+        default='models/L2CSNet_gaze360.pkl', type=str)
+    parser.add_argument(
+        '--output', dest='output', help='Output path without extension.',
+        default='models/L2CSNet_gaze360', type=str)
+    parser.add_argument(
+        '--arch', dest='arch', help='Network architecture, can be: ResNet18, ResNet34, ResNet50, ResNet101, ResNet152',
+        default='ResNet50', type=str)
+    parser.add_argument(
+        '--dataset', dest='dataset', help='Bin layout of the snapshot: gaze360, mpiigaze, socialai',
+        default='gaze360', type=str)
+    parser.add_argument(
+        '--opset', dest='opset', help='ONNX opset version.',
+        default=13, type=int)
+    args = parser.parse_args()
+    return args
+
+
+class DecodedL2CS(nn.Module):
+    """
+    L2CS followed by the bin expectation: normalized face crops -> yaw, pitch in radians
+    """
+    def __init__(self, model, layout):
+        super(DecodedL2CS, self).__init__()
+        self.model = model
+        self.register_buffer('idx_tensor', torch.arange(layout.bins, dtype=torch.float32))
+        self.binwidth = float(layout.binwidth)
+        self.angle = float(layout.angle)
+
+    def decode(self, gaze):
+        predicted = torch.softmax(gaze, dim=1)
+        degrees = torch.sum(predicted * self.idx_tensor, 1) * self.binwidth - self.angle
+        return degrees * (np.pi / 180.0)
+
+    def forward(self, x):
+        gaze_yaw, gaze_pitch = self.model(x)
+        return self.decode(gaze_yaw), self.decode(gaze_pitch)
+
+
+def export_torchscript(module, example, path):
+    traced = torch.jit.trace(module, example)
+    traced = torch.jit.freeze(traced)
+    traced.save(path)
+    return path
+
+
+def export_onnx(module, example, path, opset=13):
+    torch.onnx.export(module, example, path,
+                      input_names=['image'], output_names=['yaw', 'pitch'],
+                      dynamic_axes={'image': {0: 'batch'}, 'yaw': {0: 'batch'}, 'pitch': {0: 'batch'}},
+                      opset_version=opset, do_constant_folding=True)
+    return path
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    layout = LAYOUTS[args.dataset]
+
+    model = getArch(args.arch, layout.bins, inference=True)
+    model.load_snapshot(torch.load(args.snapshot, map_location='cpu'))
+    model.eval()
+    model.fold_bn()
+    module = DecodedL2CS(model, layout)
+    module.eval()
+
+    if os.path.dirname(args.output) and not os.path.exists(os.path.dirname(args.output)):
+        os.makedirs(os.path.dirname(args.output))
+    example = torch.randn(1, 3, 448, 448)
+    with torch.no_grad():
+        print('TorchScript: {}'.format(export_torchscript(module, example, args.output + '.pt')))
+        print('ONNX: {}'.format(export_onnx(module, example, args.output + '.onnx', args.opset)))
+
+        # the batch axis is dynamic, check the artifacts with another batch size than the traced one
+        images = torch.randn(4, 3, 448, 448)
+        yaw, pitch = module(images)
+    for path in [args.output + '.pt', args.output + '.onnx']:
+        exported = ExportedGaze(path)
+        exported_yaw, exported_pitch = exported(images)
+        print('{} ({}): max abs diff yaw {:.2e} pitch {:.2e} rad'.format(
+            path, exported.backend, np.abs(exported_yaw - yaw.numpy()).max(),
+            np.abs(exported_pitch - pitch.numpy()).max()))
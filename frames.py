@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+"""
+                                    ----------------------------------------------------------
+ Frame sources of the offline and live demos: a video file, a folder of images (sorted by name, as the frames
+ exported from the experiment recordings) or a camera index. The frames are decoded on a producer thread into a
+ bounded queue, so decoding overlaps with detection and gaze inference:
+
+     with FrameSource('recordings/p2.mp4', stride=2) as frames:
+         for frame in frames:
+             frame.index, frame.timestamp, frame.image   # frame number in the source, seconds, BGR image
+
+ A full queue blocks the producer (back-pressure) for files and folders; a camera keeps its latest frames instead,
+ dropping the oldest, so a slow consumer does not fall behind the live stream. stride=n keeps every n-th frame, the
+ skipped video frames are grabbed without being decoded.
+"""
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+Frame = namedtuple('Frame', ['index', 'timestamp', 'image'])
+
+
+class FrameSource():
+    """
+    Frames of a video file, an image folder or a camera index, decoded on a background thread.
+    fps is the frame rate of the source; image folders have none and use the fps argument.
+    """
+    def __init__(self, source, stride=1, queue_size=8, fps=23, drop=None):
+        self.source = source
+        self.stride = max(1, int(stride))
+        self.camera = isinstance(source, int) or (isinstance(source, str) and source.isdigit())
+        # live sources drop old frames rather than block
+        self.drop = self.camera if drop is None else drop
+        self.fps = fps
+        self.images = None
+        self.capture = None
+        if self.camera:
+            self.capture = cv2.VideoCapture(int(source))
+        elif os.path.isdir(source):
+            self.images = sorted(os.path.join(source, name) for name in os.listdir(source)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif source.lower().endswith(IMAGE_EXTENSIONS):
+            self.images = [source]
+        else:
+            self.capture = cv2.VideoCapture(source)
+        if self.capture is not None:
+            if not self.capture.isOpened():
+                raise IOError('Cannot open {}'.format(source))
+            self.fps = self.capture.get(cv2.CAP_PROP_FPS) or fps
+        elif len(self.images) == 0:
+            raise IOError('No image found in {}'.format(source))
+
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.error = None
+        self.dropped = 0
+        self.worker = threading.Thread(target=self.read_loop, daemon=True)
+        self.worker.start()
+
+    def __len__(self):
+        """Number of frames that will be read (0 for a camera)."""
+        if self.images is not None:
+            count = len(self.images)
+        elif self.camera:
+            return 0
+        else:
+            count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        return (count + self.stride - 1) // self.stride
+
+    def read(self, index):
+        """Frame index of the source, None at its end; frames skipped by the stride are not decoded."""
+        if self.images is not None:
+            if index >= len(self.images):
+                return None
+            image = cv2.imread(self.images[index])
+            if image is None:
+                raise IOError('Cannot read {}'.format(self.images[index]))
+            return Frame(index, index / self.fps, image)
+        for _ in range(self.stride - 1 if index > 0 else 0):
+            if not self.capture.grab():
+                return None
+        success, image = self.capture.read()
+        if not success:
+            return None
+        timestamp = time.time() if self.camera else index / self.fps
+        return Frame(index, timestamp, image)
+
+    def put(self, frame):
+        while not self.stop.is_set():
+            try:
+                self.frames.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                if self.drop:
+                    try:
+                        self.frames.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def read_loop(self):
+        try:
+            index = 0
+            while not self.stop.is_set():
+                frame = self.read(index)
+                if frame is None:
+                    break
+                self.put(frame)
+                index += self.stride
+        except Exception as e:
+            self.error = e
+        finally:
+            self.put(None)
+
+    def __iter__(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            yield frame
+        # errors of the producer are raised on the consumer thread
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def close(self):
+        self.stop.set()
+        while self.worker.is_alive():
+            try:
+                self.frames.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        if self.capture is not None:
+            self.capture.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
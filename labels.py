@@ -0,0 +1,72 @@
+import numpy as np
+
+import torch
+
+"""
+                                    ----------------------------------------------------------
+ Bin layout of the L2CS classification heads, defined once for training, evaluation and inference.
+ A head has 2 * angle / binwidth bins of binwidth degrees starting at -angle:
+
+     GAZE360   90 bins of 4 degrees in [-180, 180]   (also used for SocialAI, fine-tuned from Gaze360)
+     MPIIGAZE  28 bins of 3 degrees in [-42, 42]
+
+ encode() bins the labels of a whole dataset at once, decode() maps the logits of a head to continuous degrees
+ (softmax expectation over the bin indices).
+"""
+
+
+class BinLayout():
+    """
+    Bins of binwidth degrees covering [-angle, angle]
+    """
+    def __init__(self, angle, binwidth):
+        self.angle = angle
+        self.binwidth = binwidth
+        self.bins = int(2 * angle // binwidth)
+        self.edges = np.array(range(-angle, angle, binwidth))
+        self._idx_tensors = {}
+        self._edge_tensors = {}
+
+    def __repr__(self):
+        return 'BinLayout(bins={}, binwidth={}, angle={})'.format(self.bins, self.binwidth, self.angle)
+
+    def encode(self, degrees):
+        """Bin index of every angle in degrees (any shape)."""
+        return np.digitize(degrees, self.edges) - 1
+
+    def encode_tensor(self, degrees):
+        """encode() on a tensor, on its device."""
+        if degrees.device not in self._edge_tensors:
+            self._edge_tensors[degrees.device] = torch.tensor(self.edges, dtype=torch.float32, device=degrees.device)
+        # right=True gives the same bins as np.digitize
+        return torch.bucketize(degrees.float(), self._edge_tensors[degrees.device], right=True) - 1
+
+    def idx_tensor(self, device=torch.device('cpu')):
+        device = torch.device(device)
+        if device not in self._idx_tensors:
+            self._idx_tensors[device] = torch.arange(self.bins, dtype=torch.float32, device=device)
+        return self._idx_tensors[device]
+
+    def decode(self, gaze):
+        """Logits (N, bins) of one head -> continuous angles (N,) in degrees."""
+        predicted = torch.softmax(gaze, dim=1)
+        return torch.sum(predicted * self.idx_tensor(gaze.device), 1) * self.binwidth - self.angle
+
+
+GAZE360 = BinLayout(180, 4)
+MPIIGAZE = BinLayout(42, 3)
+
+LAYOUTS = {
+    'gaze360': GAZE360,
+    'mpiigaze': MPIIGAZE,
+    'socialai': GAZE360,
+}
+
+
+def encode_labels(gaze, layout):
+    """
+    Radian labels (N, 2) of a dataset -> continuous labels (N, 2) in degrees (float32, as the FloatTensor
+    conversion of __getitem__ used to give) and their bin indices (N, 2).
+    """
+    degrees = gaze.astype(np.float32) * 180 / np.pi
+    return degrees, layout.encode(degrees)
@@ -1,6 +1,19 @@
 import os
+import re
 import argparse
+import json
 
+from evaluate import aggregate
+
+"""
+ Average leave-one-person-out accuracy of a MPIIGaze evaluation (test.py or evaluate.py --dataset mpiigaze).
+ Reads the per-epoch results of <evalpath>/foldN/mpiigaze.json and writes <respath>/avg.log and results.json.
+ Evaluations run before the json was written only have the text logs: foldN/mpiigaze.log (or mpiigaze_binned.log)
+ is parsed instead for the folds without json.
+"""
+
+LOGS = ["mpiigaze.log", "mpiigaze_binned.log"]
+LOG_LINE = re.compile(r"\[(?P<snapshot>.+?)---mpiigaze\] Total Num:(?P<count>\d+),MAE:(?P<mean>\S+)")
 
 
 def parse_args():
@@ -9,46 +22,58 @@ def parse_args():
         description='gaze estimation using binned loss function.')
     parser.add_argument(
         '--evalpath', dest='evalpath', help='path for evaluating gaze test.',
-        default="evaluation\L2CS-gaze360-_standard-10", type=str)
+        default="evaluation/L2CS-mpiigaze", type=str)
     parser.add_argument(
         '--respath', dest='respath', help='path for saving result.',
-        default="evaluation\L2CS-gaze360-_standard-10", type=str)
+        default="evaluation/L2CS-mpiigaze", type=str)
+    args = parser.parse_args()
+    return args
+
+
+def read_log(path, fold):
+    """Per-epoch results of a fold from its text log, in the format of mpiigaze.json (snapshot, epoch, count, mean)."""
+    epochs = []
+    with open(path) as myfile:
+        for line in myfile:
+            match = LOG_LINE.search(line)
+            if match is None:
+                continue
+            snapshot = match.group('snapshot')
+            epochs.append({'snapshot': snapshot, 'epoch': ''.join(filter(lambda i: i.isdigit(), snapshot)),
+                           'count': int(match.group('count')), 'mean': float(match.group('mean'))})
+    return {'fold': fold, 'epochs': epochs}
+
+
+def read_fold(folder):
+    """Results of one fold folder: its mpiigaze.json, else its text log, None if it has neither."""
+    name = os.path.basename(folder)
+    digits = ''.join(filter(lambda i: i.isdigit(), name))
+    fold = int(digits) if digits else name
+    path = os.path.join(folder, "mpiigaze.json")
+    if os.path.isfile(path):
+        with open(path) as myfile:
+            return json.load(myfile)
+    for name in LOGS:
+        path = os.path.join(folder, name)
+        if os.path.isfile(path):
+            return read_log(path, fold)
+    return None
 
 if __name__ == '__main__':
 
     args = parse_args()
     evalpath =args.evalpath
     respath=args.respath
-    if not os.path.exist(respath):
-            os.makedirs(respath)
-    with open(os.path.join(respath,"avg.log"), 'w') as outfile:    
-        outfile.write("Average equal\n")
-
-        min=10.0
-        dirlist = os.listdir(evalpath)
-        dirlist.sort()
-        l=0.0
-        for j in range(50):
-            j=20
-            avg=0.0
-            h=j+3
-            for i in dirlist:
-                with open(evalpath+"/"+i+"/mpiigaze_binned.log") as myfile:
-                    
-                    x=list(myfile)[h]
-                    str1 = "" 
-                    
-                    # traverse in the string  
-                    for ele in x: 
-                        str1 += ele  
-                    split_string = str1.split("MAE:",1)[1] 
-                    avg+=float(split_string)
-
-            avg=avg/15.0
-            if avg<min:
-                min=avg
-                l=j+1
-            outfile.write("epoch"+str(j+1)+"= "+str(avg)+"\n")
-
-        outfile.write("min angular error equal= "+str(min)+"at epoch= "+str(l)+"\n")
-    print(min)
+
+    fold_results = []
+    dirlist = sorted(d for d in os.listdir(evalpath) if os.path.isdir(os.path.join(evalpath, d)))
+    for i in dirlist:
+        result = read_fold(os.path.join(evalpath, i))
+        if result is not None:
+            fold_results.append(result)
+    if len(fold_results) == 0:
+        raise IOError("No fold results (foldN/mpiigaze.json or mpiigaze.log) found in {}".format(evalpath))
+
+    summary = aggregate(fold_results, respath)
+    print("{} folds, min angular error equal= {} at epoch= {}".format(
+        summary['folds'], summary['best_mean'], summary['best_epoch']))
@@ -0,0 +1,64 @@
+import os
+import random
+import numpy as np
+
+import torch
+from torch.utils.data import DataLoader
+
+"""
+                                    ----------------------------------------------------------
+ DataLoader settings shared by the train scripts and trainer.py:
+
+     workers            num_workers=None sizes them from the CPUs available to the process (shared between the
+                        processes of a distributed run), at most MAX_WORKERS
+     persistent         the workers stay alive from one epoch, or validation pass, to the next instead of being
+                        started again with a copy of the dataset every time the loader is iterated
+     prefetch_factor    batches loaded in advance by each worker
+     pin_memory         only when the batches go to a GPU
+     seeding            every worker seeds numpy and random from its torch seed, so the random augmentations of
+                        the workers differ and a seeded loader gives the same batches from one run to the next
+
+     train_loader = make_loader(dataset, batch_size, shuffle=True, device=gpu)
+
+ python benchmark.py --mode loader times the loaders alone (samples/s, no model step).
+"""
+
+MAX_WORKERS = 8
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def worker_count(num_workers=None, world_size=1):
+    """num_workers, or one worker per CPU of this process (one CPU left for the training loop) if None or < 0."""
+    if num_workers is not None and num_workers >= 0:
+        return num_workers
+    return max(0, min(MAX_WORKERS, available_cpus() // max(world_size, 1) - 1))
+
+
+def seed_worker(worker_id):
+    # torch seeds each worker with base_seed + worker_id, numpy and random are not
+    seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+def make_loader(dataset, batch_size, shuffle=False, device=None, num_workers=None, sampler=None,
+                prefetch_factor=2, persistent_workers=True, drop_last=False, seed=None, world_size=1):
+    """DataLoader with the settings above; device is where the batches go (pinned memory only for CUDA)."""
+    workers = worker_count(num_workers, world_size)
+    options = {}
+    if workers > 0:
+        options = {'prefetch_factor': prefetch_factor, 'persistent_workers': persistent_workers,
+                   'worker_init_fn': seed_worker}
+    generator = None
+    if seed is not None:
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+    pin_memory = device is not None and torch.device(device).type == 'cuda' and torch.cuda.is_available()
+    return DataLoader(dataset=dataset, batch_size=int(batch_size), shuffle=shuffle and sampler is None,
+                      sampler=sampler, num_workers=workers, pin_memory=pin_memory, drop_last=drop_last,
+                      generator=generator, **options)
@@ -0,0 +1,130 @@
+import os, argparse
+import hashlib
+import numpy as np
+from multiprocessing.pool import ThreadPool
+
+from PIL import Image
+
+"""
+                                    ----------------------------------------------------------
+ Validated file manifest of the images referenced by an annotation index. Every image is checked once (stat, then
+ PIL verify of the whole file) in a thread pool, and the status of every path is saved in a .index folder under the
+ dataset root, keyed by the hash of the root and of the path list. The datasets keep only the valid entries, so
+ __getitem__ never tries to open a missing or corrupt file. Missing and corrupt files are printed and listed in a
+ .txt report next to the manifest.
+
+     valid = load_manifest('datasets/SocialAI/', index['path'])
+     python manifest.py --dataset socialai --rebuild      # check the files again after fixing the dataset
+"""
+
+MANIFEST_VERSION = 1
+OK, MISSING, CORRUPT = 0, 1, 2
+STATUS_NAMES = {OK: 'ok', MISSING: 'missing', CORRUPT: 'corrupt'}
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='Check the images referenced by the SocialAI annotations and save the valid set.')
+    parser.add_argument(
+        '--dataset', dest='dataset', help='socialai, socialai_lin, socialai_no1315',
+        default="socialai", type=str)
+    parser.add_argument(
+        '--threads', dest='threads', help='Checking threads.',
+        default=16, type=int)
+    parser.add_argument(
+        '--rebuild', dest='rebuild', help='Check the files again instead of reading the saved manifest.',
+        action='store_true')
+    args = parser.parse_args()
+    return args
+
+
+def check_image(path):
+    """Status of one image file: OK, MISSING (or empty) or CORRUPT (not readable by PIL)."""
+    try:
+        if os.stat(path).st_size == 0:
+            return MISSING
+    except OSError:
+        return MISSING
+    try:
+        with Image.open(path) as img:
+            img.verify()
+    except Exception:
+        return CORRUPT
+    return OK
+
+
+def build_manifest(root, paths, threads=16):
+    """Status (uint8 array) of every path of paths, relative to root."""
+    pool = ThreadPool(threads)
+    try:
+        status = pool.map(check_image, [os.path.join(root, path) for path in paths], chunksize=64)
+    finally:
+        pool.close()
+    return np.array(status, dtype=np.uint8)
+
+
+def manifest_key(root, paths):
+    digest = hashlib.sha1('{}:{}'.format(MANIFEST_VERSION, os.path.abspath(root)).encode())
+    for path in paths:
+        digest.update(str(path).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def report(paths, status):
+    """Print a summary of the invalid images and return one 'status path' line per invalid image."""
+    bad = np.flatnonzero(status != OK)
+    if len(bad):
+        print('{} of {} images left out: {} missing, {} corrupt'.format(
+            len(bad), len(paths), int((status == MISSING).sum()), int((status == CORRUPT).sum())))
+        for i in bad[:10]:
+            print('  {} {}'.format(STATUS_NAMES[int(status[i])], paths[i]))
+        if len(bad) > 10:
+            print('  ...')
+    return ['{} {}'.format(STATUS_NAMES[int(status[i])], paths[i]) for i in bad]
+
+
+def load_manifest(root, paths, cache_dir=None, threads=16, rebuild=False):
+    """
+    Boolean mask of the valid images of paths, read from the saved manifest of this root and path list if there is
+    one (rebuild=True checks the files again).
+    """
+    paths = [str(path) for path in paths]
+    if cache_dir is None:
+        cache_dir = os.path.join(root, '.index')
+    manifest = os.path.join(cache_dir, manifest_key(root, paths) + '.manifest.npy')
+    if os.path.exists(manifest) and not rebuild:
+        status = np.load(manifest)
+        report(paths, status)
+        return status == OK
+
+    status = build_manifest(root, paths, threads)
+    bad = report(paths, status)
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        # written under a temporary name so that concurrent loaders never read a partial file
+        tmp = manifest + '.{}.tmp'.format(os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, status)
+        os.replace(tmp, manifest)
+        with open(manifest[:-len('.npy')] + '.txt', 'w') as f:
+            f.write(''.join(line + '\n' for line in bad))
+    except OSError as e:
+        print('Manifest not saved ({})'.format(e))
+    return status == OK
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.dataset == "socialai_lin":
+        import datasets_local_lin as datasets_local
+    elif args.dataset == "socialai_no1315":
+        import datasets_local_no_par1315 as datasets_local
+    else:
+        import datasets_local
+    for train, training_val in [(True, True), (True, False), (False, True)]:
+        dataset = datasets_local.SocialAI(transform=None, train=train, training_val=training_val, high_res=True,
+                                          rebuild_manifest=args.rebuild, manifest_threads=args.threads)
+        print('train={} training_val={}: {} valid images'.format(train, training_val, len(dataset)))
@@ -0,0 +1,208 @@
+import argparse
+import time
+import numpy as np
+
+import torch
+
+from utils import spherical2cartesial, gazeto3d, angular
+
+"""
+                                    ----------------------------------------------------------
+ Batched angular-error metrics. The errors of a whole batch are computed with a few tensor operations on the device
+ of the predictions instead of one angular(gazeto3d(...), gazeto3d(...)) call per sample:
+
+     meter = AngularErrorMeter()
+     for ...:
+         meter.update(torch.stack([pitch_predicted, yaw_predicted], 1), torch.stack([label_pitch, label_yaw], 1))
+     stats = meter.compute()   # {'count', 'mean', 'median', 'p90', 'p95'} in degrees
+
+ Gaze is given as (N, 2) angles in radians, in the order used by gazeto3d. The cosine is clamped like in angular(),
+ so the results match it sample by sample (python metrics.py runs the cross-check and the timing).
+
+ TrainMeter does the same for the training losses: running sums on the device, read back only at log intervals
+ through a non-blocking copy, with images/s and the time each step waited for data vs computed:
+
+     meter = TrainMeter(device)
+     for i, batch in enumerate(meter.timed(loader)):
+         ...
+         meter.update([loss_pitch, loss_yaw], images.shape[0])
+         if (i + 1) % 100 == 0:
+             meter.flush(i + 1)
+         for report in meter.reports():
+             print(report)   # {'iteration', 'pitch', 'yaw', 'images_per_s', 'data_time', 'compute_time'}
+"""
+
+# same upper clamp as utils.angular, the lower one keeps acos defined for opposite vectors
+COS_MIN = -1.0
+COS_MAX = 0.9999999
+
+
+def angular_errors(gaze, label):
+    """Per-sample angle in degrees between the gaze directions of gaze (N, 2) and label (N, 2), in radians."""
+    gaze = torch.as_tensor(gaze)
+    label = torch.as_tensor(label).to(device=gaze.device, dtype=gaze.dtype)
+    gaze = spherical2cartesial(gaze)
+    label = spherical2cartesial(label)
+    cos = torch.sum(gaze * label, 1) / (torch.norm(gaze, dim=1) * torch.norm(label, dim=1))
+    return torch.acos(cos.clamp(COS_MIN, COS_MAX)) * 180.0 / np.pi
+
+
+def summarize(errors, percentiles=(90, 95)):
+    """Mean, median and percentiles of a 1D tensor of errors, as python floats."""
+    errors = errors.double()
+    stats = {'count': errors.numel(), 'mean': errors.mean().item(), 'median': errors.median().item()}
+    q = torch.tensor([p / 100.0 for p in percentiles], dtype=errors.dtype, device=errors.device)
+    for p, value in zip(percentiles, torch.quantile(errors, q).tolist()):
+        stats['p%d' % p] = value
+    return stats
+
+
+class AngularErrorMeter():
+    """
+    Accumulates the per-sample angular errors of an evaluation on device, reduced once in compute()
+    """
+    def __init__(self, percentiles=(90, 95)):
+        self.percentiles = percentiles
+        self.errors = []
+
+    def reset(self):
+        self.errors = []
+
+    def update(self, gaze, label):
+        errors = angular_errors(gaze, label)
+        self.errors.append(errors)
+        return errors
+
+    def compute(self):
+        if len(self.errors) == 0:
+            return {'count': 0, 'mean': float('nan'), 'median': float('nan')}
+        return summarize(torch.cat(self.errors), self.percentiles)
+
+
+class TrainMeter():
+    """
+    Running loss sums of a training epoch kept detached on the device, and per-step data wait / compute times.
+    Nothing is read back from the device between log intervals: flush() queues a non-blocking copy of the sums and
+    reports() returns the intervals whose copy (and compute) has completed, block=True waits for all of them.
+    """
+    def __init__(self, device, names=('pitch', 'yaw')):
+        self.device = torch.device(device)
+        self.names = names
+        self.cuda = self.device.type == 'cuda'
+        self.sums = torch.zeros(len(names), device=self.device)
+        self.steps = 0
+        self.pending = []
+        self.start_interval()
+
+    def start_interval(self):
+        self.images = 0
+        self.data_time = 0.0
+        self.compute_time = 0.0
+        self.events = []
+        self.interval_start = time.perf_counter()
+
+    def timed(self, loader):
+        """Iterates over loader, timing how long each batch is waited for."""
+        iterator = iter(loader)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self.step_start = time.perf_counter()
+            self.data_time += self.step_start - start
+            if self.cuda:
+                event = torch.cuda.Event(enable_timing=True)
+                event.record()
+                self.events.append([event, None])
+            yield batch
+
+    def update(self, losses, count):
+        """Adds the losses of a step, which processed count images."""
+        self.sums += torch.stack(losses).detach().float()
+        self.steps += 1
+        self.images += count
+        if self.cuda and self.events:
+            self.events[-1][1] = torch.cuda.Event(enable_timing=True)
+            self.events[-1][1].record()
+        else:
+            self.compute_time += time.perf_counter() - self.step_start
+
+    def flush(self, iteration):
+        """Queues the running means and the timings of the interval ending at iteration."""
+        elapsed = time.perf_counter() - self.interval_start
+        sums = self.sums.clone()
+        done = None
+        if self.cuda:
+            # pinned host memory, so the copy does not wait for the steps still running
+            sums = torch.empty(sums.shape, pin_memory=True).copy_(self.sums, non_blocking=True)
+            done = torch.cuda.Event()
+            done.record()
+        self.pending.append({'iteration': iteration, 'steps': self.steps, 'sums': sums, 'done': done,
+                             'events': [pair for pair in self.events if pair[1] is not None],
+                             'images': self.images, 'elapsed': elapsed, 'data_time': self.data_time,
+                             'compute_time': self.compute_time})
+        self.start_interval()
+
+    def report(self, item):
+        compute = item['compute_time'] + sum(start.elapsed_time(end) / 1000 for start, end in item['events'])
+        report = {'iteration': item['iteration'],
+                  'images_per_s': item['images'] / max(item['elapsed'], 1e-9),
+                  'data_time': item['data_time'], 'compute_time': compute}
+        for name, value in zip(self.names, (item['sums'] / max(item['steps'], 1)).tolist()):
+            report[name] = value
+        return report
+
+    def reports(self, block=False):
+        """Reports of the flushed intervals that are ready, oldest first."""
+        ready = []
+        while self.pending and (block or self.pending[0]['done'] is None or self.pending[0]['done'].query()):
+            item = self.pending.pop(0)
+            if item['done'] is not None:
+                item['done'].synchronize()
+            ready.append(self.report(item))
+        return ready
+
+    def means(self):
+        """Mean losses of all the steps so far (waits for the device)."""
+        return (self.sums / max(self.steps, 1)).tolist()
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='Cross-check and timing of the batched angular error against utils.angular.')
+    parser.add_argument(
+        '--samples', dest='samples', help='Number of gaze/label pairs (the SocialAI test set has ~5k).',
+        default=5000, type=int)
+    parser.add_argument(
+        '--batch_size', dest='batch_size', help='Batch size.',
+        default=100, type=int)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # gaze and labels spread over the Gaze360 range, pitch within +-90 degrees
+    gaze = torch.stack([torch.empty(args.samples).uniform_(-np.pi, np.pi),
+                        torch.empty(args.samples).uniform_(-np.pi / 2, np.pi / 2)], 1)
+    label = gaze + torch.randn(args.samples, 2) * 0.2
+
+    start = time.perf_counter()
+    scalar = np.array([angular(gazeto3d(g), gazeto3d(l)) for g, l in zip(gaze.numpy(), label.numpy())])
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    meter = AngularErrorMeter()
+    for i in range(0, args.samples, args.batch_size):
+        meter.update(gaze[i:i + args.batch_size], label[i:i + args.batch_size])
+    stats = meter.compute()
+    batched_time = time.perf_counter() - start
+
+    diff = np.abs(torch.cat(meter.errors).numpy() - scalar).max()
+    print('max abs diff to utils.angular over {} samples: {:.2e} deg'.format(args.samples, diff))
+    print('scalar loop  {:8.1f} ms  mean {:.4f}'.format(scalar_time * 1000.0, scalar.mean()))
+    print('batched      {:8.1f} ms  mean {:.4f}  median {:.4f}  p90 {:.4f}  p95 {:.4f}'.format(
+        batched_time * 1000.0, stats['mean'], stats['median'], stats['p90'], stats['p95']))
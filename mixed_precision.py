@@ -0,0 +1,60 @@
+import torch
+
+"""
+                                    ----------------------------------------------------------
+ Mixed-precision training step shared by the train scripts (--amp). The forward pass runs under autocast (fp16 on
+ the GPU, bf16 on the CPU) and the logits are cast back to fp32, so the cross-entropy + MSE losses are computed as
+ before. On the GPU the summed loss is scaled by a GradScaler; bf16 has the fp32 exponent range and needs no scaling.
+ Disabled, step() is exactly the previous zero_grad / backward(loss_seq) / optimizer.step().
+
+     amp = MixedPrecision(args.amp, gpu)
+     pitch, yaw = amp.forward(model, images_gaze)
+     ...
+     amp.step(optimizer_gaze, [loss_pitch_gaze, loss_yaw_gaze])
+     state['scaler_state_dict'] = amp.state_dict()
+"""
+
+
+class MixedPrecision():
+    """
+    Autocast + gradient scaling of the train scripts, a no-op when enabled is False
+    """
+    def __init__(self, enabled=False, device=torch.device('cuda')):
+        device = torch.device(device)
+        self.enabled = enabled
+        self.device_type = device.type
+        self.dtype = torch.float16 if device.type == 'cuda' else torch.bfloat16
+        self.scaler = torch.cuda.amp.GradScaler(enabled=enabled and device.type == 'cuda')
+
+    def autocast(self):
+        return torch.autocast(self.device_type, dtype=self.dtype, enabled=self.enabled)
+
+    def forward(self, model, images):
+        """Outputs of model(images) under autocast, as fp32 tensors."""
+        with self.autocast():
+            outputs = model(images)
+        return tuple(output.float() for output in outputs)
+
+    def step(self, optimizer, losses):
+        """Backward pass of the sum of losses and optimizer step."""
+        optimizer.zero_grad(set_to_none=True)
+        self.backward(losses)
+        self.apply(optimizer)
+
+    def backward(self, losses):
+        """Accumulates the gradients of the sum of losses, for gradient accumulation over several batches."""
+        torch.autograd.backward([self.scaler.scale(loss) for loss in losses])
+
+    def apply(self, optimizer):
+        """Optimizer step on the accumulated gradients, which are then cleared."""
+        self.scaler.step(optimizer)
+        self.scaler.update()
+        optimizer.zero_grad(set_to_none=True)
+
+    def state_dict(self):
+        return self.scaler.state_dict()
+
+    def load_state_dict(self, state):
+        # checkpoints written before --amp have no scaler state
+        if state:
+            self.scaler.load_state_dict(state)
@@ -3,6 +3,7 @@ import torch.nn as nn
 from torch.autograd import Variable
 import math
 import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 
 class L2CS(nn.Module):
@@ -69,5 +70,52 @@ class L2CS(nn.Module):
         pre_pitch_gaze = self.fc_pitch_gaze(x)
         return pre_yaw_gaze, pre_pitch_gaze
 
+    def load_snapshot(self, state_dict, strict=True):
+        """
+        Map the keys of a L2CS snapshot (plain or saved from nn.DataParallel) onto this model, fc_finetune being
+        dropped by the models without it. Raise KeyError on any mismatch if strict.
+        """
+        expected = set(self.state_dict().keys())
+        mapped = {}
+        for key, value in state_dict.items():
+            if key.startswith('module.'):
+                key = key[len('module.'):]
+            if key.startswith('fc_finetune.') and key not in expected:
+                continue
+            mapped[key] = value
+        missing = sorted(expected - set(mapped))
+        unexpected = sorted(set(mapped) - expected)
+        if missing or unexpected:
+            message = 'Snapshot does not match {}: missing {}, unexpected {}'.format(
+                type(self).__name__, missing, unexpected)
+            if strict:
+                raise KeyError(message)
+            print(message)
+        self.load_state_dict(mapped, strict=False)
+        return self
 
 
+class L2CSInference(L2CS):
+    """
+    Inference-only L2CS: no fc_finetune, BatchNorm folded into the convolutions by fold_bn().
+    Snapshots of L2CS (plain or saved from nn.DataParallel) are loaded with load_snapshot().
+    """
+    def __init__(self, block, layers, num_bins):
+        super(L2CSInference, self).__init__(block, layers, num_bins)
+        del self.fc_finetune
+
+    def fold_bn(self):
+        """Fold every BatchNorm into the preceding convolution. The model must be in eval mode."""
+        assert not self.training, 'fold_bn() needs the model in eval mode'
+        self.conv1 = fuse_conv_bn_eval(self.conv1, self.bn1)
+        self.bn1 = nn.Identity()
+        for layer in [self.layer1, self.layer2, self.layer3, self.layer4]:
+            for block in layer:
+                for i in [1, 2, 3]:
+                    if hasattr(block, 'bn%d' % i):
+                        conv = getattr(block, 'conv%d' % i)
+                        setattr(block, 'conv%d' % i, fuse_conv_bn_eval(conv, getattr(block, 'bn%d' % i)))
+                        setattr(block, 'bn%d' % i, nn.Identity())
+                if block.downsample is not None:
+                    block.downsample = nn.Sequential(fuse_conv_bn_eval(block.downsample[0], block.downsample[1]))
+        return self
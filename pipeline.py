@@ -0,0 +1,142 @@
+import numpy as np
+import cv2
+
+import torch
+import torch.backends.cudnn as cudnn
+
+from utils import select_device, getArch, set_cpu_threads
+from preprocess import FacePreprocessor, normalize_batch
+from labels import GAZE360
+
+from face_detection import RetinaFace
+
+"""
+                                    ----------------------------------------------------------
+ Reusable face detection + L2CS gaze estimation. The detector, the model and the bin index tensor (cached by the bin layout) are
+ built once when the pipeline is created, so the demos and robot scripts only pay for the per-frame work.
+
+     pipeline = GazePipeline('models/L2CSNet_gaze360.pkl', arch='ResNet50', gpu_id='0')   # gpu_id='cpu' without GPU
+     bboxes, scores, yaw, pitch = pipeline.predict(frame)
+
+ yaw and pitch are in radians and follow the order of the model heads (fc_yaw_gaze, fc_pitch_gaze).
+ All the faces of a frame go through the model as one batch, so the cost of a frame stays nearly flat with the
+ number of people in it.
+"""
+
+
+class GazePipeline():
+    """
+    Stateful gaze estimator for BGR frames (as returned by cv2 or the pepper socket)
+    """
+    def __init__(self, snapshot_path, arch='ResNet50', gpu_id='0', layout=GAZE360,
+                 confidence=.95, pitch_offset=0, max_faces=None, strict=True, threads=None, interop_threads=None,
+                 channels_last=False):
+        """
+        layout: bin layout of the classification heads (labels.GAZE360 or labels.MPIIGAZE).
+        confidence: minimum RetinaFace score for a face to be processed.
+        pitch_offset: compensation in degrees added to the pitch prediction.
+        max_faces: if set, only the max_faces most confident faces of a frame are processed.
+        strict: raise on any snapshot key mismatch (see L2CSInference.load_snapshot), only report it otherwise.
+        threads, interop_threads: intra-op and inter-op thread counts of the CPU backend (torch default if None).
+        channels_last: run the model in the NHWC memory format, usually faster for convolutions on CPU.
+        """
+        cudnn.enabled = True
+        self.gpu = select_device(gpu_id, batch_size=1)
+        cuda = self.gpu.type == 'cuda'
+        if not cuda:
+            set_cpu_threads(threads, interop_threads)
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        self.layout = layout
+        self.bins = layout.bins
+        self.confidence = confidence
+        self.pitch_offset = pitch_offset
+        self.max_faces = max_faces
+
+        # crop, resize, BGR->RGB and normalization needed after the face detection
+        self.preprocess = FacePreprocessor(448, device=self.gpu, memory_format=self.memory_format)
+
+        # inference-only variant: no fc_finetune, BatchNorm folded into the convolutions
+        self.model = getArch(arch, layout.bins, inference=True)
+        print('Loading snapshot.')
+        saved_state_dict = torch.load(snapshot_path, map_location=self.gpu)
+        self.model.load_snapshot(saved_state_dict, strict=strict)
+        self.model.eval()
+        self.model.fold_bn()
+        self.model.to(self.gpu, memory_format=self.memory_format)
+
+        self.detector = RetinaFace(gpu_id=0 if cuda else -1)  # 0 for gpu, -1 for CPU
+
+    def detect(self, frame):
+        """Return the boxes [x_min, y_min, x_max, y_max] clipped to the frame and the scores of the confident faces."""
+        bboxes = []
+        scores = []
+        height, width = frame.shape[:2]
+        faces = self.detector(frame)
+        if faces is not None:
+            for box, landmarks, score in faces:
+                if score < self.confidence:
+                    continue
+                x_min = max(int(box[0]), 0)
+                y_min = max(int(box[1]), 0)
+                x_max = min(int(box[2]), width)
+                y_max = min(int(box[3]), height)
+                if x_max <= x_min or y_max <= y_min:
+                    continue
+                bboxes.append([x_min, y_min, x_max, y_max])
+                scores.append(score)
+        bboxes = np.array(bboxes, dtype=np.int64).reshape(-1, 4)
+        scores = np.array(scores, dtype=np.float32)
+        if self.max_faces is not None and len(scores) > self.max_faces:
+            keep = np.sort(np.argsort(-scores, kind='stable')[:self.max_faces])
+            bboxes = bboxes[keep]
+            scores = scores[keep]
+        return bboxes, scores
+
+    def decode(self, gaze):
+        """Map the bin logits of one head to continuous angles in degrees."""
+        return self.layout.decode(gaze)
+
+    def estimate(self, frame, bboxes):
+        """Gaze (yaw, pitch) in radians for the faces in bboxes, computed with a single forward pass."""
+        if len(bboxes) == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+
+        return self.forward(self.preprocess(frame, bboxes))
+
+    def crop(self, frame, bboxes):
+        """uint8 BGR crops (N, 448, 448, 3) of the faces in bboxes, in new arrays (safe to call from several threads)."""
+        size = self.preprocess.size
+        crops = np.empty((len(bboxes), size, size, 3), dtype=np.uint8)
+        for i, (x_min, y_min, x_max, y_max) in enumerate(bboxes):
+            cv2.resize(frame[y_min:y_max, x_min:x_max], (size, size), dst=crops[i], interpolation=cv2.INTER_LINEAR)
+        return crops
+
+    def estimate_crops(self, crops):
+        """Gaze (yaw, pitch) in radians of crops from crop(), possibly of several frames, in one forward pass."""
+        if len(crops) == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+        batch = torch.from_numpy(crops).to(self.gpu)
+        return self.forward(normalize_batch(batch, channels_last=True, bgr=True, memory_format=self.memory_format))
+
+    def forward(self, img):
+        """Gaze (yaw, pitch) in radians of a normalized batch of face crops."""
+        with torch.no_grad():
+            # gaze prediction
+            gaze_yaw, gaze_pitch = self.model(img)
+
+            # Get continuous predictions in degrees.
+            yaw_predicted = self.decode(gaze_yaw)
+            pitch_predicted = self.decode(gaze_pitch) + self.pitch_offset
+
+            # one device to host copy for all the faces of the frame
+            gaze = torch.stack([yaw_predicted, pitch_predicted]).cpu().numpy() * np.pi / 180.0
+        return gaze[0], gaze[1]
+
+    def predict(self, frame):
+        """
+        Detect the faces in frame and estimate their gaze.
+        Returns bboxes (N, 4), scores (N,), yaw (N,) and pitch (N,), N being the number of confident faces.
+        """
+        bboxes, scores = self.detect(frame)
+        yaw, pitch = self.estimate(frame, bboxes)
+        return bboxes, scores, yaw, pitch
@@ -0,0 +1,75 @@
+import numpy as np
+import cv2
+
+import torch
+
+"""
+                                    ----------------------------------------------------------
+ Fused face-crop preprocessing for the inference path. It replaces
+
+     cv2.resize(224) -> cv2.cvtColor(BGR2RGB) -> Image.fromarray -> Resize(448) -> ToTensor -> Normalize
+
+ with one cv2.resize per crop straight to the model input size, written into a preallocated (pinned when a GPU is
+ used) uint8 buffer. The BGR->RGB swap, the conversion to float and the mean/std normalization are then done on the
+ whole batch with a single vectorized torch operation on the target device.
+
+ The two are not numerically identical: the legacy path downsamples the crop to 224 with cv2 and upsamples it to
+ 448 with PIL, the fused one resizes the crop once, so it keeps the detail lost at 224 and interpolates differently.
+ The normalization itself matches ToTensor + Normalize to float precision. The mean absolute difference of the
+ inputs of the two paths stays under LEGACY_TOLERANCE (normalized units, about 6 grey levels); single pixels on
+ sharp edges differ by more. python benchmark.py --mode preprocess checks it on real frames.
+"""
+
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+LEGACY_TOLERANCE = 0.1
+
+
+def normalize_batch(batch, channels_last=True, bgr=False, memory_format=torch.contiguous_format):
+    """
+    uint8 batch (N, H, W, 3) if channels_last else (N, 3, H, W) -> normalized float (N, 3, H, W), same device.
+    Equivalent to ToTensor + Normalize(MEAN, STD) applied to every image; bgr=True also swaps BGR to RGB.
+    memory_format is the layout of the returned tensor (torch.channels_last for NHWC models).
+    """
+    if channels_last:
+        batch = batch.permute(0, 3, 1, 2)
+    if bgr:
+        batch = batch.flip(1)
+    # (x / 255 - mean) / std == x * scale + shift
+    scale = torch.tensor([1.0 / (255.0 * s) for s in STD], device=batch.device).view(1, 3, 1, 1)
+    shift = torch.tensor([-m / s for m, s in zip(MEAN, STD)], device=batch.device).view(1, 3, 1, 1)
+    return torch.addcmul(shift, batch.float(), scale).contiguous(memory_format=memory_format)
+
+
+class FacePreprocessor():
+    """
+    Crops, resizes and normalizes the faces of a BGR frame into one model-ready batch
+    """
+    def __init__(self, size=448, device=torch.device('cpu'), max_batch=8, memory_format=torch.contiguous_format):
+        self.size = size
+        self.device = device
+        self.memory_format = memory_format
+        self.pin_memory = device.type == 'cuda'
+        self.copied = None
+        self._allocate(max_batch)
+
+    def _allocate(self, max_batch):
+        self.buffer = torch.empty((max_batch, self.size, self.size, 3), dtype=torch.uint8, pin_memory=self.pin_memory)
+        self.buffer_np = self.buffer.numpy()
+
+    def __call__(self, frame, bboxes):
+        """Normalized float batch (N, 3, size, size) on self.device for the N boxes [x_min, y_min, x_max, y_max]."""
+        n = len(bboxes)
+        if self.copied is not None:
+            # the previous asynchronous copy must be done before the buffer is overwritten
+            self.copied.synchronize()
+        if n > len(self.buffer):
+            self._allocate(n)
+        for i, (x_min, y_min, x_max, y_max) in enumerate(bboxes):
+            cv2.resize(frame[y_min:y_max, x_min:x_max], (self.size, self.size), dst=self.buffer_np[i],
+                       interpolation=cv2.INTER_LINEAR)
+        batch = self.buffer[:n].to(self.device, non_blocking=self.pin_memory)
+        if self.pin_memory:
+            self.copied = torch.cuda.Event()
+            self.copied.record()
+        return normalize_batch(batch, channels_last=True, bgr=True, memory_format=self.memory_format)
@@ -0,0 +1,238 @@
+import os, argparse
+import io
+import time
+import numpy as np
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Subset
+from torchvision import transforms
+from torchvision.models.quantization.resnet import QuantizableBasicBlock, QuantizableBottleneck
+
+from PIL import Image
+import datasets
+from model import L2CS
+from utils import gazeto3d, angular, set_cpu_threads
+from labels import GAZE360
+
+"""
+                                    ----------------------------------------------------------
+ Post-training static int8 quantization of L2CS for CPU serving.
+ The conv-bn-relu sequences of the backbone are fused, observers are calibrated on a few hundred face crops
+ (Gaze360 test split, or any folder of crops such as the SocialAI headcrops) and the model is converted to int8.
+ The tool prints the angular error of fp32 and int8, their latency on CPU and the snapshot sizes, then saves the
+ int8 state dict, which is reloaded with load_quantized().
+
+     python quantize.py --snapshot models/L2CSNet_gaze360.pkl --output models/L2CSNet_gaze360_int8.pkl
+     python quantize.py --crops datasets/SocialAI/headcrop7 --calib 300
+"""
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='int8 static quantization of a L2CS-Net snapshot.')
+    parser.add_argument(
+        '--snapshot', dest='snapshot', help='Path of the fp32 model snapshot.',
+        default='models/L2CSNet_gaze360.pkl', type=str)
+    parser.add_argument(
+        '--output', dest='output', help='Path of the int8 snapshot to write.',
+        default='models/L2CSNet_gaze360_int8.pkl', type=str)
+    parser.add_argument(
+        '--arch', dest='arch', help='Network architecture, can be: ResNet18, ResNet34, ResNet50, ResNet101, ResNet152',
+        default='ResNet50', type=str)
+    parser.add_argument(
+        '--backend', dest='backend', help='Quantized engine: fbgemm (x86) or qnnpack (ARM)',
+        default='fbgemm', type=str)
+    parser.add_argument(
+        '--gaze360image_dir', dest='gaze360image_dir', help='Directory path for gaze images.',
+        default='datasets/Gaze360/Image', type=str)
+    parser.add_argument(
+        '--gaze360label_dir', dest='gaze360label_dir', help='Directory path for gaze labels.',
+        default='datasets/Gaze360/Label/test.label', type=str)
+    parser.add_argument(
+        '--crops', dest='crops', help='Folder of face crops used instead of Gaze360 (no labels, only the fp32/int8 '
+                                      'disagreement is reported).',
+        default=None, type=str)
+    parser.add_argument(
+        '--calib', dest='calib', help='Number of crops used for calibration.',
+        default=300, type=int)
+    parser.add_argument(
+        '--eval', dest='eval', help='Number of crops used to compare fp32 and int8.',
+        default=500, type=int)
+    parser.add_argument(
+        '--batch_size', dest='batch_size', help='Batch size.',
+        default=20, type=int)
+    parser.add_argument(
+        '--threads', dest='threads', help='Intra-op CPU threads [torch default]',
+        default=None, type=int)
+    args = parser.parse_args()
+    return args
+
+
+class QuantizableL2CS(L2CS):
+    """
+    L2CS with quant/dequant stubs around the network and fusable torchvision quantizable blocks
+    """
+    def __init__(self, block, layers, num_bins):
+        super(QuantizableL2CS, self).__init__(block, layers, num_bins)
+        self.quant = torch.quantization.QuantStub()
+        self.dequant = torch.quantization.DeQuantStub()
+
+    def forward(self, x):
+        x = self.quant(x)
+        pre_yaw_gaze, pre_pitch_gaze = super(QuantizableL2CS, self).forward(x)
+        return self.dequant(pre_yaw_gaze), self.dequant(pre_pitch_gaze)
+
+    def fuse_model(self):
+        torch.quantization.fuse_modules(self, ['conv1', 'bn1', 'relu'], inplace=True)
+        for m in self.modules():
+            if type(m) in (QuantizableBasicBlock, QuantizableBottleneck):
+                m.fuse_model()
+
+
+def getQuantizableArch(arch, bins):
+    # same layouts as utils.getArch with the quantizable blocks
+    if arch == 'ResNet18':
+        model = QuantizableL2CS(QuantizableBasicBlock, [2, 2, 2, 2], bins)
+    elif arch == 'ResNet34':
+        model = QuantizableL2CS(QuantizableBasicBlock, [3, 4, 6, 3], bins)
+    elif arch == 'ResNet101':
+        model = QuantizableL2CS(QuantizableBottleneck, [3, 4, 23, 3], bins)
+    elif arch == 'ResNet152':
+        model = QuantizableL2CS(QuantizableBottleneck, [3, 8, 36, 3], bins)
+    else:
+        if arch != 'ResNet50':
+            print('Invalid value for architecture is passed! '
+                  'The default value of ResNet50 will be used instead!')
+        model = QuantizableL2CS(QuantizableBottleneck, [3, 4, 6, 3], bins)
+    return model
+
+
+def prepare_quantized(arch, bins, backend='fbgemm', state_dict=None):
+    """Fused model with observers inserted, ready for calibration."""
+    torch.backends.quantized.engine = backend
+    model = getQuantizableArch(arch, bins)
+    if state_dict is not None:
+        model.load_snapshot(state_dict)
+    model.eval()
+    model.fuse_model()
+    model.qconfig = torch.quantization.get_default_qconfig(backend)
+    torch.quantization.prepare(model, inplace=True)
+    return model
+
+
+def load_quantized(path, arch='ResNet50', bins=90, backend='fbgemm'):
+    """Rebuild the int8 model structure and load an int8 snapshot written by this tool."""
+    model = prepare_quantized(arch, bins, backend)
+    torch.quantization.convert(model, inplace=True)
+    model.load_state_dict(torch.load(path, map_location='cpu'))
+    model.eval()
+    return model
+
+
+class CropFolder(torch.utils.data.Dataset):
+    """Unlabelled face crops of a folder, returned in the same layout as datasets.Gaze360."""
+    def __init__(self, root, transform):
+        self.root = root
+        self.transform = transform
+        self.images = sorted(img for img in os.listdir(root) if img.lower().endswith((".jpg", ".jpeg", ".png")))
+
+    def __len__(self):
+        return len(self.images)
+
+    def __getitem__(self, idx):
+        img = Image.open(os.path.join(self.root, self.images[idx])).convert('RGB')
+        return self.transform(img), 0, torch.full((2,), float('nan')), self.images[idx]
+
+
+def predict(model, loader, layout=GAZE360):
+    """Continuous predictions (N, 2) and labels (N, 2) in radians, in the order of the model heads."""
+    predictions = []
+    labels = []
+    with torch.no_grad():
+        for images, _, cont_labels, _ in loader:
+            gaze_pitch, gaze_yaw = model(images)
+            predictions.append(torch.stack([layout.decode(gaze_pitch), layout.decode(gaze_yaw)], 1) * np.pi / 180.0)
+            labels.append(cont_labels.float() * np.pi / 180.0)
+    return torch.cat(predictions).numpy(), torch.cat(labels).numpy()
+
+
+def mean_angular(a, b):
+    return np.mean([angular(gazeto3d(p), gazeto3d(l)) for p, l in zip(a, b)])
+
+
+def latency(model, runs=20):
+    """Mean CPU latency in ms of one 448x448 face."""
+    image = torch.randn(1, 3, 448, 448)
+    with torch.no_grad():
+        for _ in range(3):
+            model(image)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(image)
+    return (time.perf_counter() - start) * 1000.0 / runs
+
+
+def snapshot_size(model):
+    """Size in MB of the serialized state dict."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes / 1e6
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    set_cpu_threads(args.threads)
+    bins = GAZE360.bins
+
+    transformations = transforms.Compose([
+        transforms.Resize(448),
+        transforms.ToTensor(),
+        transforms.Normalize(
+            mean=[0.485, 0.456, 0.406],
+            std=[0.229, 0.224, 0.225]
+        )
+    ])
+    if args.crops is not None:
+        dataset = CropFolder(args.crops, transformations)
+    else:
+        dataset = datasets.Gaze360(args.gaze360label_dir, args.gaze360image_dir, transformations, 180, 4, train=False)
+    # calibration and evaluation crops do not overlap
+    calib_set = Subset(dataset, range(min(args.calib, len(dataset))))
+    eval_set = Subset(dataset, range(len(calib_set), min(len(calib_set) + args.eval, len(dataset))))
+    if len(eval_set) == 0:
+        eval_set = calib_set
+    calib_loader = DataLoader(calib_set, batch_size=args.batch_size, shuffle=False, num_workers=4)
+    eval_loader = DataLoader(eval_set, batch_size=args.batch_size, shuffle=False, num_workers=4)
+
+    saved_state_dict = torch.load(args.snapshot, map_location='cpu')
+    fp32 = getQuantizableArch(args.arch, bins)
+    fp32.load_snapshot(saved_state_dict)
+    fp32.eval()
+
+    print('Calibrating on {} crops.'.format(len(calib_set)))
+    int8 = prepare_quantized(args.arch, bins, args.backend, saved_state_dict)
+    with torch.no_grad():
+        for images, _, _, _ in calib_loader:
+            int8(images)
+    torch.quantization.convert(int8, inplace=True)
+
+    print('Comparing on {} crops.'.format(len(eval_set)))
+    fp32_gaze, labels = predict(fp32, eval_loader)
+    int8_gaze, _ = predict(int8, eval_loader)
+    if not np.isnan(labels).any():
+        fp32_error = mean_angular(fp32_gaze, labels)
+        int8_error = mean_angular(int8_gaze, labels)
+        print('angular error  fp32 {:.3f} deg  int8 {:.3f} deg  delta {:+.3f} deg'.format(
+            fp32_error, int8_error, int8_error - fp32_error))
+    print('fp32/int8 disagreement {:.3f} deg'.format(mean_angular(fp32_gaze, int8_gaze)))
+    print('latency        fp32 {:.1f} ms  int8 {:.1f} ms'.format(latency(fp32), latency(int8)))
+    print('snapshot size  fp32 {:.1f} MB  int8 {:.1f} MB'.format(snapshot_size(fp32), snapshot_size(int8)))
+
+    torch.save(int8.state_dict(), args.output)
+    reloaded = load_quantized(args.output, args.arch, bins, args.backend)
+    check_loader = DataLoader(Subset(eval_set, range(min(len(eval_set), args.batch_size))), batch_size=args.batch_size)
+    reloaded_gaze, _ = predict(reloaded, check_loader)
+    print('int8 snapshot saved to {} (reload max diff {:.2e} rad)'.format(
+        args.output, np.abs(reloaded_gaze - int8_gaze[:len(reloaded_gaze)]).max()))
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+"""
+                                    ----------------------------------------------------------
+ Per-frame gaze results of the offline demos, streamed to a CSV or Parquet file (by the extension of the path) in
+ chunks of chunk_size rows instead of being collected in lists and written at the end: the memory stays flat for
+ recordings of any length and the rows written before a crash are kept (the CSV is flushed after every chunk).
+
+     with ResultWriter('output/p2.csv') as results:
+         for result in staged.run(frames):
+             results.add(result)
+
+ One row per frame: frame, timestamp (s), x_min, y_min, x_max, y_max, score, gaze_pitch, gaze_yaw (radians), empty
+ when no face was found. Parquet needs pyarrow (pip install pyarrow).
+
+ The csv of the previous demo had a "yaw" column holding the pitch head and a "pitch" column holding the yaw head.
+ The angles are written under new names so that scripts reading the old columns fail instead of silently getting
+ the other angle: its "yaw" is gaze_pitch here and its "pitch" gaze_yaw.
+"""
+
+COLUMNS = ['frame', 'timestamp', 'x_min', 'y_min', 'x_max', 'y_max', 'score', 'gaze_pitch', 'gaze_yaw']
+
+
+class ResultWriter():
+    """
+    Appends FrameResult rows to path, one chunk of chunk_size rows at a time
+    """
+    def __init__(self, path, chunk_size=500):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.parquet = path.lower().endswith('.parquet')
+        if self.parquet and pq is None:
+            raise ImportError('pyarrow is required for {} (pip install pyarrow), or write a .csv'.format(path))
+        folder = os.path.dirname(path)
+        if folder and not os.path.isdir(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.rows = []
+        self.count = 0
+        self.file = None
+        self.writer = None
+
+    def add(self, result):
+        """Row of a video_pipeline.FrameResult."""
+        bbox = [np.nan] * 4 if result.bbox is None else [int(value) for value in result.bbox]
+        self.rows.append([result.index, result.timestamp] + bbox + [
+            np.nan if result.score is None else result.score,
+            np.nan if result.pitch is None else result.pitch,
+            np.nan if result.yaw is None else result.yaw])
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        chunk = pd.DataFrame(self.rows, columns=COLUMNS)
+        # the frames without face make the bbox columns float, write them as nullable integers
+        chunk = chunk.astype({'frame': 'int64', 'x_min': 'Int64', 'y_min': 'Int64', 'x_max': 'Int64', 'y_max': 'Int64'})
+        if self.parquet:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            # one row group per chunk; the footer is written by close(), also run by the with block on errors
+            self.writer.write_table(table)
+        else:
+            if self.file is None:
+                self.file = open(self.path, 'w', newline='')
+            chunk.to_csv(self.file, header=self.count == 0, index=False)
+            self.file.flush()
+        self.count += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,65 @@
+import os
+import numpy as np
+
+import torch
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+"""
+                                    ----------------------------------------------------------
+ Runs a gaze model exported by export.py without the training code (no model.py, utils.py or datasets).
+ The exported graph already contains the softmax / bin expectation / degree->radian decode, so it maps normalized
+ face crops (N, 3, 448, 448) straight to yaw and pitch in radians.
+
+     gaze = ExportedGaze('models/L2CSNet_gaze360.onnx')
+     yaw, pitch = gaze(images)
+
+ .onnx files run with onnxruntime on CPU when it is installed, otherwise the TorchScript file written next to it
+ (same name, .pt) is used.
+"""
+
+
+class ExportedGaze():
+    """
+    Loader for the TorchScript (.pt) or ONNX (.onnx) artifacts of export.py
+    """
+    def __init__(self, path, device=torch.device('cpu'), threads=None):
+        self.device = device
+        self.session = None
+        self.module = None
+        root, ext = os.path.splitext(path)
+        if ext == '.onnx' and onnxruntime is not None and device.type == 'cpu':
+            options = onnxruntime.SessionOptions()
+            if threads is not None:
+                options.intra_op_num_threads = threads
+            self.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+            self.input_name = self.session.get_inputs()[0].name
+            return
+        if ext == '.onnx':
+            if onnxruntime is None:
+                print('onnxruntime is not installed, falling back to TorchScript.')
+            path = root + '.pt'
+        if not os.path.exists(path):
+            raise IOError('No TorchScript artifact found at {}'.format(path))
+        self.module = torch.jit.load(path, map_location=device)
+        self.module.eval()
+
+    @property
+    def backend(self):
+        return 'onnxruntime' if self.session is not None else 'torchscript'
+
+    def __call__(self, images):
+        """yaw, pitch in radians (numpy arrays of shape (N,)) for a normalized float batch (N, 3, H, W)."""
+        if self.session is not None:
+            if isinstance(images, torch.Tensor):
+                images = images.detach().cpu().numpy()
+            yaw, pitch = self.session.run(None, {self.input_name: np.ascontiguousarray(images, dtype=np.float32)})
+            return yaw, pitch
+        if not isinstance(images, torch.Tensor):
+            images = torch.from_numpy(images)
+        with torch.no_grad():
+            yaw, pitch = self.module(images.to(self.device))
+        return yaw.cpu().numpy(), pitch.cpu().numpy()
@@ -0,0 +1,141 @@
+import os, argparse
+import math
+import tempfile
+
+import torch
+import torch.nn as nn
+
+"""
+                                    ----------------------------------------------------------
+ Learning rate schedules of the train scripts. The optimizer is built once for the whole run and LRSchedule sets the
+ learning rate of every param group in place at the start of each epoch, base lr of the group times:
+
+     poly      (1 - epoch / max_iter) ** power         (utils_local.poly_lr_scheduler)
+     cosine    0.5 * (1 + cos(pi * epoch / max_iter))
+     constant  1, as in train.py
+     warmup    linear ramp over the first warmup epochs, before any of them
+
+ so the Adam moments are kept from one epoch to the next. The optimizer and the schedule are saved in
+ checkpoint/latest_model.pth and restored on resume. python scheduler.py checks that a run interrupted and resumed
+ from a checkpoint ends with the same weights as an uninterrupted one on a toy model; tests/test_resume.py checks
+ the weights, Adam moments, learning rates and schedule of a resumed Trainer run.
+"""
+
+SCHEDULES = ['poly', 'cosine', 'constant']
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='Check that a resumed training run matches an uninterrupted one.')
+    parser.add_argument(
+        '--schedule', dest='schedule', help='poly, cosine, constant',
+        default="poly", type=str)
+    parser.add_argument(
+        '--epochs', dest='epochs', help='Length of the run.',
+        default=8, type=int)
+    parser.add_argument(
+        '--warmup', dest='warmup', help='Warmup epochs.',
+        default=2, type=int)
+    args = parser.parse_args()
+    return args
+
+
+class LRSchedule():
+    """
+    Per-epoch learning rate of the param groups of optimizer, relative to the learning rates it was built with
+    """
+    def __init__(self, optimizer, schedule='poly', max_iter=60, power=0.9, warmup=0):
+        if schedule not in SCHEDULES:
+            raise ValueError('Unknown learning rate schedule {}, expected one of {}'.format(schedule, SCHEDULES))
+        self.optimizer = optimizer
+        self.schedule = schedule
+        self.max_iter = max_iter
+        self.power = power
+        self.warmup = warmup
+        self.base_lrs = [group['lr'] for group in optimizer.param_groups]
+        self.last_epoch = -1
+
+    def factor(self, epoch):
+        if epoch < self.warmup:
+            return (epoch + 1) / (self.warmup + 1)
+        progress = min(epoch / self.max_iter, 1.0)
+        if self.schedule == 'constant':
+            return 1.0
+        if self.schedule == 'cosine':
+            return 0.5 * (1 + math.cos(math.pi * progress))
+        return (1 - progress) ** self.power
+
+    def step(self, epoch):
+        """Set the learning rates of epoch and return them."""
+        self.last_epoch = epoch
+        factor = self.factor(epoch)
+        for group, base_lr in zip(self.optimizer.param_groups, self.base_lrs):
+            group['lr'] = base_lr * factor
+        return [group['lr'] for group in self.optimizer.param_groups]
+
+    def state_dict(self):
+        return {key: value for key, value in self.__dict__.items() if key != 'optimizer'}
+
+    def load_state_dict(self, state):
+        # checkpoints written before the schedule was saved only have the optimizer state
+        if state:
+            self.__dict__.update(state)
+
+
+def check_resume(schedule, epochs, warmup):
+    """Weights after epochs of an uninterrupted run and of a run stopped at epochs // 2 and resumed."""
+    torch.manual_seed(0)
+    images = torch.randn(64, 16)
+    labels = torch.randn(64, 2)
+    initial = nn.Linear(16, 2).state_dict()
+
+    def build():
+        model = nn.Linear(16, 2)
+        model.load_state_dict(initial)
+        optimizer = torch.optim.Adam([
+            {'params': [model.weight], 'lr': 1e-2},
+            {'params': [model.bias], 'lr': 1e-3}
+        ], 1e-2, weight_decay=1e-4)
+        return model, optimizer, LRSchedule(optimizer, schedule, max_iter=epochs, warmup=warmup)
+
+    def train(model, optimizer, scheduler, start, stop):
+        for epoch in range(start, stop):
+            scheduler.step(epoch)
+            for batch in torch.randperm(len(images)).split(16):
+                loss = ((model(images[batch]) - labels[batch]) ** 2).mean()
+                optimizer.zero_grad(set_to_none=True)
+                loss.backward()
+                optimizer.step()
+
+    torch.manual_seed(1)
+    model, optimizer, scheduler = build()
+    train(model, optimizer, scheduler, 0, epochs)
+    uninterrupted = model.state_dict()
+
+    torch.manual_seed(1)
+    model, optimizer, scheduler = build()
+    train(model, optimizer, scheduler, 0, epochs // 2)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'latest_model.pth')
+        torch.save({"epoch": epochs // 2 - 1, "model_state_dict": model.state_dict(),
+                    'optimizer_state_dict': optimizer.state_dict(), 'scheduler_state_dict': scheduler.state_dict(),
+                    'rng_state': torch.get_rng_state()}, path)
+        checkpoint = torch.load(path)
+    model, optimizer, scheduler = build()
+    model.load_state_dict(checkpoint['model_state_dict'])
+    optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+    scheduler.load_state_dict(checkpoint['scheduler_state_dict'])
+    torch.set_rng_state(checkpoint['rng_state'])
+    train(model, optimizer, scheduler, checkpoint['epoch'] + 1, epochs)
+    return uninterrupted, model.state_dict()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    uninterrupted, resumed = check_resume(args.schedule, args.epochs, args.warmup)
+    difference = max((uninterrupted[key] - resumed[key]).abs().max().item() for key in uninterrupted)
+    print('{} schedule, {} epochs resumed at {}: max weight difference {:.3e}'.format(
+        args.schedule, args.epochs, args.epochs // 2, difference))
+    if difference != 0:
+        raise SystemExit('The resumed run does not match the uninterrupted one')
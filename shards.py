@@ -0,0 +1,158 @@
+import os, argparse
+import json
+import time
+import numpy as np
+
+import torch
+from torch.utils.data import DataLoader
+from torch.utils.data.dataset import Dataset
+from PIL import Image
+
+import datasets
+import datasets_local
+
+"""
+                                    ----------------------------------------------------------
+ Pre-decoded image shards for training. The face crops of a dataset are decoded and resized once into uint8
+ (N, 3, size, size) arrays split in shards of shard_size images (shard_00000.npy, ...), next to an index.npz
+ holding the shard offsets, the binned and continuous labels and the names. ShardDataset memory-maps the shards
+ and returns uint8 tensors without decoding anything; the batch is normalized on the device with
+ preprocess.normalize_batch(images, channels_last=False), which is equivalent to ToTensor + Normalize.
+
+     python shards.py --dataset socialai --split train --output shards/socialai/train
+     python shards.py --dataset socialai --split val --output shards/socialai/val
+     python shards.py --dataset gaze360 --gaze360label_dir datasets/Gaze360/Label/train.label --output shards/gaze360/train
+"""
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(
+        description='Decode and resize a gaze dataset once into memory-mapped uint8 shards.')
+    parser.add_argument(
+        '--dataset', dest='dataset', help='gaze360, socialai',
+        default="socialai", type=str)
+    parser.add_argument(
+        '--split', dest='split', help='SocialAI split: train, val, test',
+        default="train", type=str)
+    parser.add_argument(
+        '--gaze360image_dir', dest='gaze360image_dir', help='Directory path for gaze images.',
+        default='datasets/Gaze360/Image', type=str)
+    parser.add_argument(
+        '--gaze360label_dir', dest='gaze360label_dir', help='Directory path for gaze labels.',
+        default='datasets/Gaze360/Label/train.label', type=str)
+    parser.add_argument(
+        '--output', dest='output', help='Output folder of the shards.',
+        default='shards/socialai/train', type=str)
+    parser.add_argument(
+        '--size', dest='size', help='Side of the resized crops.',
+        default=448, type=int)
+    parser.add_argument(
+        '--shard_size', dest='shard_size', help='Images per shard.',
+        default=1024, type=int)
+    parser.add_argument(
+        '--num_workers', dest='num_workers', help='Decoding processes.',
+        default=4, type=int)
+    args = parser.parse_args()
+    return args
+
+
+class ImageDecoder(Dataset):
+    """Decodes and resizes the images of paths, in the same way as transforms.Resize((size, size)) on PIL images."""
+    def __init__(self, paths, size=448):
+        self.paths = paths
+        self.size = size
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        try:
+            img = Image.open(self.paths[idx]).convert('RGB').resize((self.size, self.size), Image.BILINEAR)
+        except (IOError, OSError):
+            return torch.zeros((3, self.size, self.size), dtype=torch.uint8), False
+        return torch.from_numpy(np.asarray(img).transpose(2, 0, 1).copy()), True
+
+
+def image_paths(dataset):
+    """Image paths of an index-backed dataset (datasets.Gaze360, datasets.Mpiigaze, datasets_local.SocialAI)."""
+    field = 'face' if 'face' in dataset.index.dtype.names else 'path'
+    return [os.path.join(dataset.root, path) for path in dataset.index[field]]
+
+
+def build_shards(dataset, output, size=448, shard_size=1024, num_workers=4):
+    """Write the decoded images and the labels of dataset to output; unreadable images are left out."""
+    if not os.path.exists(output):
+        os.makedirs(output)
+    loader = DataLoader(ImageDecoder(image_paths(dataset), size), batch_size=shard_size, shuffle=False,
+                        num_workers=num_workers)
+    keep = []
+    offsets = [0]
+    for shard, (images, ok) in enumerate(loader):
+        images = images[ok].numpy()
+        np.save(os.path.join(output, 'shard_{:05d}.npy'.format(shard)), images)
+        keep.append(ok.numpy())
+        offsets.append(offsets[-1] + len(images))
+        print('shard {}: {} images'.format(shard, len(images)))
+    keep = np.concatenate(keep) if keep else np.zeros(0, dtype=bool)
+    if not keep.all():
+        print('{} unreadable images left out'.format(int((~keep).sum())))
+
+    names = dataset.index['name'][keep] if 'name' in dataset.index.dtype.names else np.zeros(0, dtype=str)
+    np.savez(os.path.join(output, 'index.npz'), offsets=np.array(offsets), labels=dataset.labels[keep],
+             cont_labels=dataset.cont_labels[keep], names=names)
+    with open(os.path.join(output, 'meta.json'), 'w') as outfile:
+        json.dump({'size': size, 'shard_size': shard_size, 'count': int(offsets[-1]),
+                   'dataset': type(dataset).__name__}, outfile, indent=2)
+    return offsets[-1]
+
+
+class ShardDataset(Dataset):
+    """
+    Reads the shards written by build_shards: (uint8 image (3, size, size), labels, cont_labels[, name])
+    """
+    def __init__(self, path):
+        self.path = path
+        index = np.load(os.path.join(path, 'index.npz'))
+        self.offsets = index['offsets']
+        self.labels = index['labels']
+        self.cont_labels = index['cont_labels']
+        self.names = index['names'] if len(index['names']) else None
+        self.shards = None
+
+    def __getstate__(self):
+        # the memory maps are opened again in every worker instead of being pickled
+        state = self.__dict__.copy()
+        state['shards'] = None
+        return state
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx):
+        if self.shards is None:
+            # copy-on-write maps: pages are read lazily and the tensors are writable without copying the file
+            self.shards = [np.load(os.path.join(self.path, 'shard_{:05d}.npy'.format(i)), mmap_mode='c')
+                           for i in range(len(self.offsets) - 1)]
+        shard = np.searchsorted(self.offsets, idx, side='right') - 1
+        img = torch.from_numpy(self.shards[shard][idx - self.offsets[shard]])
+        labels = self.labels[idx]
+        cont_labels = torch.tensor(self.cont_labels[idx])
+        if self.names is not None:
+            return img, labels, cont_labels, str(self.names[idx])
+        return img, labels, cont_labels
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.dataset == "gaze360":
+        dataset = datasets.Gaze360(args.gaze360label_dir, args.gaze360image_dir, None, 180, 4)
+    else:
+        if args.split == "test":
+            dataset = datasets_local.SocialAI(transform=None, train=False, high_res=True)
+        else:
+            dataset = datasets_local.SocialAI(transform=None, train=True, training_val=args.split == "train",
+                                              high_res=True)
+    start = time.time()
+    count = build_shards(dataset, args.output, args.size, args.shard_size, args.num_workers)
+    print('{} images written to {} in {:.1f} s'.format(count, args.output, time.time() - start))
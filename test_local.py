@@ -10,8 +10,10 @@ import torch.backends.cudnn as cudnn
 import torchvision
 
 import datasets
-from utils import select_device, natural_keys, gazeto3d, angular
+from utils import select_device, natural_keys
 from model import L2CS
+from metrics import AngularErrorMeter
+from labels import GAZE360, MPIIGAZE
 
 
 def parse_args():
@@ -44,7 +46,7 @@ def parse_args():
         '--evalpath', dest='evalpath', help='path for the output evaluating gaze test.',
         default="evaluation/L2CS-gaze360-_loader-180-4-lr", type=str)
     parser.add_argument(
-        '--gpu',dest='gpu_id', help='GPU device id to use [0]',
+        '--gpu', '--device', dest='gpu_id', help='GPU device id to use [0] or cpu',
         default="0", type=str)
     parser.add_argument(
         '--batch_size', dest='batch_size', help='Batch size.',
@@ -117,7 +119,6 @@ if __name__ == '__main__':
         # list all epochs for testing
         folder = os.listdir(snapshot_path)
         folder.sort(key=natural_keys)
-        softmax = nn.Softmax(dim=1)
         with open(os.path.join(evalpath,data_set+".log"), 'w') as outfile:
             configuration = f"\ntest configuration = gpu_id={gpu}, batch_size={batch_size}, model_arch={arch}\nStart testing dataset={data_set}----------------------------------------\n"
             print(configuration)
@@ -129,19 +130,17 @@ if __name__ == '__main__':
             for epochs in folder:
                 # Base network structure
                 model=getArch(arch, 90)
-                saved_state_dict = torch.load(os.path.join(snapshot_path, epochs))
+                saved_state_dict = torch.load(os.path.join(snapshot_path, epochs), map_location=gpu)
                 model.load_state_dict(saved_state_dict)
-                model.cuda(gpu)
+                model.to(gpu)
                 model.eval()
                 total = 0
-                idx_tensor = [idx for idx in range(90)]
-                idx_tensor = torch.FloatTensor(idx_tensor).cuda(gpu)
-                avg_error = .0
+                meter = AngularErrorMeter()
                 
                 
                 with torch.no_grad():           
                     for j, (images, labels, cont_labels, name) in enumerate(test_loader):
-                        images = Variable(images).cuda(gpu)
+                        images = Variable(images).to(gpu)
                         total += cont_labels.size(0)
 
                         label_pitch = cont_labels[:,0].float()*np.pi/180
@@ -155,24 +154,20 @@ if __name__ == '__main__':
                         _, yaw_bpred = torch.max(gaze_yaw.data, 1)
                         
             
-                        # Continuous predictions
-                        pitch_predicted = softmax(gaze_pitch)
-                        yaw_predicted = softmax(gaze_yaw)
-                        
-                        # mapping from binned (0 to 28) to angels (-180 to 180)  
-                        pitch_predicted = torch.sum(pitch_predicted * idx_tensor, 1).cpu() * 4 - 180
-                        yaw_predicted = torch.sum(yaw_predicted * idx_tensor, 1).cpu() * 4 - 180
+                        # Continuous predictions in degrees
+                        pitch_predicted = GAZE360.decode(gaze_pitch)
+                        yaw_predicted = GAZE360.decode(gaze_yaw)
 
                         pitch_predicted = pitch_predicted*np.pi/180
                         yaw_predicted = yaw_predicted*np.pi/180
 
-                        for p,y,pl,yl in zip(pitch_predicted,yaw_predicted,label_pitch,label_yaw):
-                            avg_error += angular(gazeto3d([p,y]), gazeto3d([pl,yl]))
+                        meter.update(torch.stack([pitch_predicted, yaw_predicted], 1), torch.stack([label_pitch, label_yaw], 1))
                         
+                stats = meter.compute()
                 x = ''.join(filter(lambda i: i.isdigit(), epochs))
                 epoch_list.append(x)
-                avg_MAE.append(avg_error/total)
-                loger = f"[{epochs}---{args.dataset}] Total Num:{total},MAE:{avg_error/total}\n"
+                avg_MAE.append(stats['mean'])
+                loger = f"[{epochs}---{args.dataset}] Total Num:{total},MAE:{stats['mean']}\n"
                 outfile.write(loger)
                 print(loger)
         
@@ -211,7 +206,6 @@ if __name__ == '__main__':
             folder = os.listdir(os.path.join(snapshot_path,"fold"+str(fold)))
             folder.sort(key=natural_keys)
             
-            softmax = nn.Softmax(dim=1)
             with open(os.path.join(evalpath, os.path.join("fold"+str(fold), data_set+".log")), 'w') as outfile:
                 configuration = f"\ntest configuration equal gpu_id={gpu}, batch_size={batch_size}, model_arch={arch}\nStart testing dataset={data_set}, fold={fold}---------------------------------------\n"
                 print(configuration)
@@ -220,18 +214,16 @@ if __name__ == '__main__':
                 avg_MAE=[]
                 for epochs in folder: 
                     model=model_used
-                    saved_state_dict = torch.load(os.path.join(snapshot_path+"/fold"+str(fold),epochs))
+                    saved_state_dict = torch.load(os.path.join(snapshot_path+"/fold"+str(fold),epochs), map_location=gpu)
                     model= nn.DataParallel(model,device_ids=[0])
                     model.load_state_dict(saved_state_dict)
-                    model.cuda(gpu)
+                    model.to(gpu)
                     model.eval()
                     total = 0
-                    idx_tensor = [idx for idx in range(28)]
-                    idx_tensor = torch.FloatTensor(idx_tensor).cuda(gpu)
-                    avg_error = .0
+                    meter = AngularErrorMeter()
                     with torch.no_grad():
                         for j, (images, labels, cont_labels, name) in enumerate(test_loader):
-                            images = Variable(images).cuda(gpu)
+                            images = Variable(images).to(gpu)
                             total += cont_labels.size(0)
 
                             label_pitch = cont_labels[:,0].float()*np.pi/180
@@ -245,28 +237,22 @@ if __name__ == '__main__':
                             _, yaw_bpred = torch.max(gaze_yaw.data, 1)
                             
                 
-                            # Continuous predictions
-                            pitch_predicted = softmax(gaze_pitch)
-                            yaw_predicted = softmax(gaze_yaw)
-                            
-                            # mapping from binned (0 to 28) to angels (-42 to 42)                
-                            pitch_predicted = \
-                                torch.sum(pitch_predicted * idx_tensor, 1).cpu() * 3 - 42
-                            yaw_predicted = \
-                                torch.sum(yaw_predicted * idx_tensor, 1).cpu() * 3 - 42
+                            # Continuous predictions in degrees
+                            pitch_predicted = MPIIGAZE.decode(gaze_pitch)
+                            yaw_predicted = MPIIGAZE.decode(gaze_yaw)
                             
                             
                             pitch_predicted = pitch_predicted*np.pi/180
                             yaw_predicted = yaw_predicted*np.pi/180
 
-                            for p,y,pl,yl in zip(pitch_predicted, yaw_predicted, label_pitch, label_yaw):
-                                avg_error += angular(gazeto3d([p,y]), gazeto3d([pl,yl]))
+                            meter.update(torch.stack([pitch_predicted, yaw_predicted], 1), torch.stack([label_pitch, label_yaw], 1))
             
                         
+                    stats = meter.compute()
                     x = ''.join(filter(lambda i: i.isdigit(), epochs))
                     epoch_list.append(x)
-                    avg_MAE.append(avg_error/ total)
-                    loger = f"[{epochs}---{args.dataset}] Total Num:{total},MAE:{avg_error/total} \n"
+                    avg_MAE.append(stats['mean'])
+                    loger = f"[{epochs}---{args.dataset}] Total Num:{total},MAE:{stats['mean']} \n"
                     outfile.write(loger)
                     print(loger)
         
@@ -292,18 +278,15 @@ if __name__ == '__main__':
             pin_memory=True, )
 
         model=getArch(arch, 90)
-        saved_state_dict = torch.load(os.path.join(snapshot_path, "best_model.pth"))
+        saved_state_dict = torch.load(os.path.join(snapshot_path, "best_model.pth"), map_location=gpu)
         model.load_state_dict(saved_state_dict)
-        model.cuda(gpu)
+        model.to(gpu)
         model.eval()
         total = 0
-        idx_tensor = [idx for idx in range(90)]
-        idx_tensor = torch.FloatTensor(idx_tensor).cuda(gpu)
-        avg_error = .0
-        softmax = nn.Softmax(dim=1)
+        meter = AngularErrorMeter()
         with torch.no_grad():
             for i, (images, labels, cont_labels) in enumerate(test_dataset_loader):
-                images = Variable(images).cuda(gpu)
+                images = Variable(images).to(gpu)
                 total += cont_labels.size(0)
 
                 label_pitch = cont_labels[:,0].float()*np.pi/180
@@ -317,24 +300,20 @@ if __name__ == '__main__':
                 _, yaw_bpred = torch.max(gaze_yaw.data, 1)
                 
     
-                # Continuous predictions
-                pitch_predicted = softmax(gaze_pitch)
-                yaw_predicted = softmax(gaze_yaw)
-                
-                # mapping from binned (0 to 28) to angels (-180 to 180)  
-                pitch_predicted = torch.sum(pitch_predicted * idx_tensor, 1).cpu() * 4 - 180
-                yaw_predicted = torch.sum(yaw_predicted * idx_tensor, 1).cpu() * 4 - 180
+                # Continuous predictions in degrees
+                pitch_predicted = GAZE360.decode(gaze_pitch)
+                yaw_predicted = GAZE360.decode(gaze_yaw)
 
                 pitch_predicted = pitch_predicted*np.pi/180
                 yaw_predicted = yaw_predicted*np.pi/180
 
-                for p,y,pl,yl in zip(pitch_predicted,yaw_predicted,label_pitch,label_yaw):
-                    avg_error += angular(gazeto3d([p,y]), gazeto3d([pl,yl]))
+                meter.update(torch.stack([pitch_predicted, yaw_predicted], 1), torch.stack([label_pitch, label_yaw], 1))
 
+        stats = meter.compute()
         print('Test results, len dataset: %d '
-              'AVG angular error %.4f' % (
+              'AVG angular error %.4f, median %.4f, p95 %.4f' % (
                   len(test_dataset) ,
-                  avg_error/total,
+                  stats['mean'], stats['median'], stats['p95'],
               )
               )
 
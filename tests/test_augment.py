@@ -0,0 +1,59 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+from augment import BatchAugment
+from labels import GAZE360
+from preprocess import normalize_batch
+
+
+def flip_only(yaw_column):
+    return BatchAugment(GAZE360, yaw_column=yaw_column, flip=1.0, crop=0, brightness=0, contrast=0, saturation=0)
+
+
+def batch(n=4, size=32):
+    torch.manual_seed(0)
+    images = torch.randint(0, 256, (n, 3, size, size), dtype=torch.uint8)
+    cont_labels = torch.empty(n, 2).uniform_(-60, 60)
+    return images, GAZE360.encode_tensor(cont_labels), cont_labels
+
+
+@pytest.mark.parametrize('yaw_column', [0, 1])
+def test_flip_negates_and_rebins_yaw(yaw_column):
+    images, labels, cont_labels = batch()
+    flipped, flipped_labels, flipped_cont = flip_only(yaw_column)(images, labels, cont_labels)
+    pitch_column = 1 - yaw_column
+
+    assert torch.allclose(flipped, normalize_batch(images.flip(3), channels_last=False), atol=1e-4)
+    assert torch.equal(flipped_cont[:, yaw_column], -cont_labels[:, yaw_column])
+    assert torch.equal(flipped_labels[:, yaw_column], GAZE360.encode_tensor(-cont_labels[:, yaw_column]))
+    assert torch.equal(flipped_cont[:, pitch_column], cont_labels[:, pitch_column])
+    assert torch.equal(flipped_labels[:, pitch_column], labels[:, pitch_column])
+    # the inputs are left untouched
+    assert not torch.equal(flipped_cont, cont_labels)
+
+
+def test_trainer_flips_the_socialai_yaw(tmp_path):
+    from trainer import DEFAULTS, Trainer, SyntheticGaze
+
+    class SocialAITrainer(Trainer):
+        # SocialAI labels are (yaw, pitch), without the dataset files
+        def build_datasets(self):
+            return SyntheticGaze(4, 32), None
+
+    config = dict(DEFAULTS, dataset='socialai', augment=True, arch='ResNet18', pretrained=False, gpu='cpu',
+                  batch_size=2, num_workers=0, output=str(tmp_path / 'output'),
+                  checkpoint=str(tmp_path / 'latest_model.pth'))
+    trainer = SocialAITrainer(config)
+    assert trainer.augment.yaw_column == 0
+    trainer.augment = flip_only(trainer.augment.yaw_column)
+    trainer.net.train()
+
+    images, labels, cont_labels = batch(2)
+    _, batch_labels, batch_cont = trainer.batch((images, labels, cont_labels))
+    # the batch comes out as (pitch, yaw), the yaw of the SocialAI labels negated
+    assert torch.equal(batch_cont[:, 1], -cont_labels[:, 0])
+    assert torch.equal(batch_cont[:, 0], cont_labels[:, 1])
+    assert torch.equal(batch_labels[:, 1], GAZE360.encode_tensor(-cont_labels[:, 0]))
+    trainer.writer.close()
@@ -0,0 +1,44 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+pytest.importorskip('matplotlib')
+
+from evaluate import decode_dataset
+
+
+class IndexDataset(torch.utils.data.Dataset):
+    """(image, labels, cont_labels, name) items drawn from the gaze of an index, as datasets.Gaze360."""
+    def __init__(self, gaze, root='Image', transform=None):
+        self.index = np.array([(g,) for g in gaze], dtype=[('gaze', np.float64, (2,))])
+        self.root = root
+        self.transform = transform
+        self.reads = 0
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, idx):
+        self.reads += 1
+        gaze = torch.tensor(self.index['gaze'][idx], dtype=torch.float32)
+        img = torch.full((3, 4, 4), int(abs(gaze[0]) * 10) % 256, dtype=torch.uint8)
+        return img, torch.zeros(2, dtype=torch.int64), gaze, str(idx)
+
+
+def test_cache_is_reused_only_for_the_same_dataset(tmp_path):
+    cache = str(tmp_path / 'test.npy')
+    gaze = [(1.0, 2.0), (3.0, 4.0)]
+    images, cont_labels = decode_dataset(IndexDataset(gaze), cache, batch_size=2, num_workers=0)
+
+    same = IndexDataset(gaze)
+    cached_images, cached_labels = decode_dataset(same, cache, batch_size=2, num_workers=0)
+    assert same.reads == 0
+    assert np.array_equal(cached_images, images) and np.array_equal(cached_labels, cont_labels)
+
+    # same number of samples, other labels, image root or transform
+    for changed in [IndexDataset([(5.0, 6.0), (7.0, 8.0)]), IndexDataset(gaze, root='Other'),
+                    IndexDataset(gaze, transform='resized')]:
+        changed_images, changed_labels = decode_dataset(changed, cache, batch_size=2, num_workers=0)
+        assert changed.reads == len(gaze)
+        assert np.array_equal(changed_labels, np.array(changed.index['gaze'], dtype=np.float32))
@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+import trainer
+
+
+def test_train_folds_gives_every_fold_its_own_port(monkeypatch):
+    configs = []
+    monkeypatch.setattr(trainer, 'train_fold', lambda config, threads=None: configs.append(config))
+    config = dict(trainer.DEFAULTS, dataset='mpiigaze', folds=[0, 1, 2], fold_jobs=1, world_size=2,
+                  master_port=29500, gpu='cpu', name='folds')
+    trainer.train_folds(config)
+    assert [c['fold'] for c in configs] == [0, 1, 2]
+    assert [c['master_port'] for c in configs] == [29500, 29501, 29502]
+
+
+def test_train_fold_overrides_inherited_port(monkeypatch):
+    ports = []
+    monkeypatch.setattr(trainer, 'train', lambda config: ports.append(os.environ['MASTER_PORT']))
+    monkeypatch.setenv('MASTER_PORT', '29500')
+    monkeypatch.delenv('RANK', raising=False)
+    assert trainer.train_fold(dict(fold=4, world_size=2, master_port=29504)) == 4
+    assert ports == ['29504']
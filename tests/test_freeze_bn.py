@@ -0,0 +1,61 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+from utils import getArch
+from trainer import get_ignored_params, get_non_ignored_params, get_fc_params, freeze_bn
+
+
+def build_optimizer(model):
+    optimizer = torch.optim.Adam([
+        {'params': get_ignored_params(model), 'lr': 0},
+        {'params': get_non_ignored_params(model), 'lr': 1e-5},
+        {'params': get_fc_params(model), 'lr': 1e-5}
+    ], 1e-5)
+    # as the train scripts: optimizer built once, model.train() at the start of every epoch
+    model.train()
+    return optimizer
+
+
+def running_mean(model):
+    return model.layer1[0].bn1.running_mean.clone()
+
+
+def step(model, optimizer):
+    yaw, pitch = model(torch.randn(2, 3, 64, 64))
+    optimizer.zero_grad()
+    (yaw.sum() + pitch.sum()).backward()
+    optimizer.step()
+
+
+def test_freeze_bn_keeps_running_stats():
+    torch.manual_seed(0)
+    model = getArch('ResNet18', 90)
+    optimizer = build_optimizer(model)
+    freeze_bn(model)
+    before = running_mean(model)
+    step(model, optimizer)
+    assert torch.equal(running_mean(model), before)
+    assert not model.layer1[0].bn1.training
+
+
+def test_train_mode_updates_running_stats_without_freeze_bn():
+    torch.manual_seed(0)
+    model = getArch('ResNet18', 90)
+    optimizer = build_optimizer(model)
+    before = running_mean(model)
+    step(model, optimizer)
+    assert not torch.equal(running_mean(model), before)
+
+
+def test_trainer_epoch_keeps_running_stats(tmp_path):
+    from trainer import DEFAULTS, Trainer
+    config = dict(DEFAULTS, dataset='synthetic', synthetic_size=4, arch='ResNet18', pretrained=False, gpu='cpu',
+                  num_epochs=1, batch_size=2, num_workers=0, param_groups='all', lr_schedule='constant',
+                  output=str(tmp_path / 'output'), checkpoint=str(tmp_path / 'latest_model.pth'))
+    trainer = Trainer(config)
+    before = running_mean(trainer.net)
+    trainer.train_epoch(0)
+    assert torch.equal(running_mean(trainer.net), before)
+    trainer.writer.close()
@@ -0,0 +1,71 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+from utils import getArch
+
+# fp32 on CPU: folding the BatchNorm only changes the rounding of the convolutions
+RTOL = 1e-4
+ATOL = 1e-4
+
+
+def random_l2cs():
+    torch.manual_seed(0)
+    model = getArch('ResNet18', 90)
+    # non-trivial BatchNorm statistics and affine parameters, the freshly built ones fold to the identity
+    for module in model.modules():
+        if isinstance(module, torch.nn.BatchNorm2d):
+            module.running_mean.uniform_(-0.1, 0.1)
+            module.running_var.uniform_(0.5, 1.5)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.1, 0.1)
+    return model.eval()
+
+
+def test_folded_inference_model_matches_l2cs():
+    model = random_l2cs()
+    lean = getArch('ResNet18', 90, inference=True)
+    lean.load_snapshot(model.state_dict(), strict=True)
+    lean.eval()
+    lean.fold_bn()
+
+    images = torch.randn(2, 3, 64, 64)
+    with torch.no_grad():
+        outputs = model(images)
+        lean_outputs = lean(images)
+    assert len(outputs) == len(lean_outputs) == 2
+    for head, lean_head in zip(outputs, lean_outputs):
+        assert torch.allclose(head, lean_head, rtol=RTOL, atol=ATOL)
+
+
+def test_load_snapshot_accepts_data_parallel_keys():
+    model = random_l2cs()
+    state = {'module.' + key: value for key, value in model.state_dict().items()}
+    lean = getArch('ResNet18', 90, inference=True).load_snapshot(state, strict=True).eval()
+    images = torch.randn(1, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.equal(model(images)[0], lean(images)[0])
+
+
+def test_load_snapshot_strict_raises_on_missing_key():
+    state = random_l2cs().state_dict()
+    del state['fc_yaw_gaze.weight']
+    with pytest.raises(KeyError):
+        getArch('ResNet18', 90, inference=True).load_snapshot(state, strict=True)
+
+
+def test_load_snapshot_strict_raises_on_unexpected_key():
+    state = random_l2cs().state_dict()
+    state['fc_roll_gaze.weight'] = state['fc_yaw_gaze.weight']
+    with pytest.raises(KeyError):
+        getArch('ResNet18', 90, inference=True).load_snapshot(state, strict=True)
+
+
+def test_l2cs_load_snapshot_keeps_fc_finetune():
+    # the fp32 models of quantize.py are full L2CS, loaded from the same snapshots
+    model = random_l2cs()
+    state = {'module.' + key: value for key, value in model.state_dict().items()}
+    loaded = getArch('ResNet18', 90).load_snapshot(state, strict=True)
+    for key, value in model.state_dict().items():
+        assert torch.equal(loaded.state_dict()[key], value), key
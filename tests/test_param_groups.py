@@ -0,0 +1,22 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+from trainer import DEFAULTS, Trainer
+
+
+def test_fc_finetune_is_not_trained(tmp_path):
+    config = dict(DEFAULTS, dataset='synthetic', synthetic_size=4, arch='ResNet18', pretrained=False, gpu='cpu',
+                  num_epochs=1, batch_size=2, num_workers=0, param_groups='all', lr_schedule='constant',
+                  output=str(tmp_path / 'output'), checkpoint=str(tmp_path / 'latest_model.pth'))
+    trainer = Trainer(config)
+    optimized = {id(param) for group in trainer.optimizer.param_groups for param in group['params']}
+    for param in trainer.net.fc_finetune.parameters():
+        assert id(param) not in optimized
+        assert not param.requires_grad
+    # every other parameter is optimized once, so DDP needs no find_unused_parameters
+    others = [param for name, param in trainer.net.named_parameters() if not name.startswith('fc_finetune.')]
+    assert optimized == {id(param) for param in others}
+    assert 'fc_finetune.weight' in trainer.net.state_dict()
+    trainer.writer.close()
@@ -0,0 +1,45 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+cv2 = pytest.importorskip('cv2')
+transforms = pytest.importorskip('torchvision.transforms')
+Image = pytest.importorskip('PIL.Image')
+
+from preprocess import FacePreprocessor, normalize_batch, MEAN, STD, LEGACY_TOLERANCE
+
+
+def legacy_transform():
+    return transforms.Compose([
+        transforms.Resize(448),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=MEAN, std=STD)
+    ])
+
+
+def smooth_frame(height=480, width=640):
+    # low-frequency content, as a face crop, so the interpolations of the two paths agree
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = [127 + 100 * np.sin(x / 40.0 + phase) * np.cos(y / 55.0) for phase in (0.0, 1.0, 2.0)]
+    return np.clip(np.stack(channels, 2), 0, 255).astype(np.uint8)
+
+
+def test_normalize_batch_matches_to_tensor_normalize():
+    frame = np.random.RandomState(0).randint(0, 256, (32, 48, 3), dtype=np.uint8)
+    expected = transforms.Normalize(mean=MEAN, std=STD)(transforms.ToTensor()(frame[:, :, ::-1].copy()))
+    batch = normalize_batch(torch.from_numpy(frame)[None], channels_last=True, bgr=True)
+    assert torch.allclose(batch[0], expected, atol=1e-5)
+
+
+def test_fused_preprocessing_close_to_pil_path():
+    frame = smooth_frame()
+    bbox = np.array([[170, 90, 470, 390]])
+    x_min, y_min, x_max, y_max = bbox[0]
+    img = cv2.resize(frame[y_min:y_max, x_min:x_max], (224, 224))
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    legacy = legacy_transform()(Image.fromarray(img)).unsqueeze(0)
+
+    fused = FacePreprocessor(448)(frame, bbox)
+    assert fused.shape == legacy.shape == (1, 3, 448, 448)
+    # not identical: one resize to 448 instead of 224 then 448 (see preprocess.py)
+    assert (fused - legacy).abs().mean().item() < LEGACY_TOLERANCE
@@ -0,0 +1,65 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torchvision')
+
+from trainer import DEFAULTS, Trainer
+
+EPOCHS = 4
+INTERRUPT = 2
+
+
+class Interrupted(Exception):
+    pass
+
+
+class InterruptedTrainer(Trainer):
+    """Stops at the start of epoch INTERRUPT, after the checkpoint of the previous epoch."""
+    def train_epoch(self, epoch):
+        if epoch == INTERRUPT:
+            raise Interrupted()
+        return super(InterruptedTrainer, self).train_epoch(epoch)
+
+
+def make_config(folder):
+    return dict(DEFAULTS, dataset='synthetic', synthetic_size=4, arch='ResNet18', pretrained=False, gpu='cpu',
+                num_epochs=EPOCHS, batch_size=2, num_workers=0, lr=1e-3, lr_schedule='poly', warmup_epochs=1,
+                name='resume', output=str(folder / 'output'), checkpoint=str(folder / 'latest_model.pth'))
+
+
+def final_state(trainer):
+    return trainer.net.state_dict(), trainer.optimizer.state_dict(), trainer.scheduler.state_dict()
+
+
+def test_resumed_run_matches_uninterrupted_run(tmp_path):
+    torch.manual_seed(0)
+    trainer = Trainer(make_config(tmp_path / 'uninterrupted'))
+    trainer.fit()
+    weights, optimizer, schedule = final_state(trainer)
+
+    config = make_config(tmp_path / 'interrupted')
+    torch.manual_seed(0)
+    trainer = InterruptedTrainer(config)
+    with pytest.raises(Interrupted):
+        trainer.fit()
+    # the checkpoint of the last epoch is written in the background
+    trainer.writer.close()
+
+    trainer = Trainer(config)
+    assert trainer.start_epoch == INTERRUPT
+    trainer.fit()
+    resumed_weights, resumed_optimizer, resumed_schedule = final_state(trainer)
+
+    assert weights.keys() == resumed_weights.keys()
+    for key in weights:
+        assert torch.equal(weights[key], resumed_weights[key]), key
+    # Adam moments and step of every parameter
+    assert optimizer['state'].keys() == resumed_optimizer['state'].keys()
+    for index, state in optimizer['state'].items():
+        for name, value in state.items():
+            assert torch.equal(torch.as_tensor(value), torch.as_tensor(resumed_optimizer['state'][index][name])), \
+                (index, name)
+    assert [group['lr'] for group in optimizer['param_groups']] == \
+        [group['lr'] for group in resumed_optimizer['param_groups']]
+    assert schedule['last_epoch'] == resumed_schedule['last_epoch'] == EPOCHS - 1
+    assert schedule['base_lrs'] == resumed_schedule['base_lrs']
@@ -0,0 +1,52 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+torch = pytest.importorskip('torch')
+pytest.importorskip('cv2')
+transforms = pytest.importorskip('torchvision.transforms')
+Image = pytest.importorskip('PIL.Image')
+
+import datasets
+from shards import build_shards, ShardDataset
+
+SIZE = 16
+# pitch, yaw in radians, different enough to catch swapped columns
+GAZE = [(0.1, -0.6), (-0.3, 0.5), (0.25, 1.2)]
+
+
+def gaze360_dataset(folder):
+    root = folder / 'Image'
+    root.mkdir()
+    random = np.random.RandomState(0)
+    lines = ['Face Left Right Origin WhichEye 2DGaze 3DGaze 3DHead']
+    for i, (pitch, yaw) in enumerate(GAZE):
+        face = 'face_{}.jpg'.format(i)
+        # various sizes, so that the crops are resized
+        pixels = random.randint(0, 256, (20 + 7 * i, 30 - 3 * i, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(str(root / face))
+        lines.append('{} left.jpg right.jpg person{} eye {},{} 0,0,0 0,0,0'.format(face, i, pitch, yaw))
+    label = folder / 'train.label'
+    label.write_text('\n'.join(lines) + '\n')
+    transform = transforms.Compose([transforms.Resize((SIZE, SIZE)), transforms.PILToTensor()])
+    return datasets.Gaze360(str(label), str(root), transform, 180, 4)
+
+
+def test_shards_round_trip(tmp_path):
+    dataset = gaze360_dataset(tmp_path)
+    assert len(dataset) == len(GAZE)
+    # two shards, the second one partial
+    count = build_shards(dataset, str(tmp_path / 'shards'), size=SIZE, shard_size=2, num_workers=0)
+    shards = ShardDataset(str(tmp_path / 'shards'))
+    assert count == len(shards) == len(dataset)
+
+    for i in range(len(dataset)):
+        img, labels, cont_labels, name = dataset[i]
+        shard_img, shard_labels, shard_cont_labels, shard_name = shards[i]
+        assert shard_img.dtype == torch.uint8
+        assert torch.equal(shard_img, img)
+        assert np.array_equal(shard_labels, labels)
+        assert torch.equal(shard_cont_labels, cont_labels)
+        assert shard_name == name == 'person{}'.format(i)
+        # (pitch, yaw) column order of the source labels
+        assert torch.allclose(cont_labels.double(), torch.tensor(GAZE[i], dtype=torch.float64) * 180 / np.pi,
+                              atol=1e-4)
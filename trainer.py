@@ -0,0 +1,638 @@
+import os, argparse
+import json
+import time
+from collections import namedtuple
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import torch
+import torch.nn as nn
+import torch.utils.model_zoo as model_zoo
+from torchvision import transforms
+import torch.backends.cudnn as cudnn
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
+from torch.utils.data.dataset import Dataset
+
+import datasets
+import datasets_local
+import datasets_local_lin
+import datasets_local_no_par1315
+from utils import select_device, getArch
+from labels import GAZE360, MPIIGAZE, LAYOUTS
+from metrics import AngularErrorMeter, TrainMeter
+from mixed_precision import MixedPrecision
+from scheduler import LRSchedule
+from shards import ShardDataset
+from preprocess import normalize_batch
+from augment import BatchAugment
+from checkpoint import CheckpointWriter
+from loaders import make_loader
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+"""
+                                    ----------------------------------------------------------
+ One training engine for every dataset of the forked train scripts (train.py, train_local*.py), driven by a JSON
+ (or YAML, if PyYAML is installed) config. The datasets, their bin layout and label order, and the param-group
+ policies are looked up by name, so a new experiment is a config file:
+
+     python trainer.py --config configs/socialai_lin.json
+     python trainer.py --config configs/mpiigaze.json --set folds=[0,1,2] --set batch_size=16
+     python trainer.py --config configs/socialai_lin.json --set world_size=4          # DDP, 4 processes
+     python trainer.py --config configs/mpiigaze.json --set fold_jobs=3               # 3 folds at a time
+     python trainer.py --config configs/ddp_check.json                                 # gloo DDP on CPU, no data
+
+ Every run supports --amp (mixed_precision.py), the poly/cosine schedules with one optimizer (scheduler.py), batched
+ augmentation (augment.py), shards (shards.py), gradient accumulation (accumulation_steps), validation every
+ validation_step epochs and checkpoints written on a background thread with keep_last retention (checkpoint.py).
+ The snapshots are saved as output/<name>/_epoch_N.pkl (output/<name>/foldN/ for MPIIGaze), as before, so test.py
+ and evaluate.py read them.
+
+ world_size > 1 spawns one DistributedDataParallel process per GPU, or per group of CPU cores with the gloo backend
+ (torchrun also works, the ranks are then read from the environment). batch_size is per process, every process
+ reads its own part of the data through a DistributedSampler, and only rank 0 logs, validates and writes
+ checkpoints. fold_jobs runs the MPIIGaze leave-one-out folds as independent jobs, the GPUs of gpu being assigned
+ to them in turn; with world_size > 1 every job is a distributed run of its own, the i-th fold on master_port + i.
+"""
+
+DEFAULTS = {
+    'dataset': 'socialai_lin',
+    'arch': 'ResNet50',
+    # snapshot to fine-tune, the ImageNet weights of arch if empty
+    'snapshot': '',
+    'output': 'output/snapshots/',
+    'name': '',
+    'gpu': '0',
+    'num_epochs': 60,
+    'batch_size': 32,
+    'accumulation_steps': 1,
+    'lr': 0.00001,
+    'weight_decay': 0.0001,
+    'alpha': 1,
+    'param_groups': 'backbone',
+    'lr_schedule': 'poly',
+    'warmup_epochs': 0,
+    'validation_step': 1,
+    'log_interval': 500,
+    # null sizes the loader workers from the CPU count (loaders.worker_count)
+    'num_workers': None,
+    'prefetch_factor': 2,
+    'persistent_workers': True,
+    'amp': False,
+    'augment': False,
+    'shards': '',
+    'checkpoint': 'checkpoint/latest_model.pth',
+    # _epoch_N.pkl snapshots kept besides the best one, 0 keeps all (evaluate.py picks the best epoch from all)
+    'keep_last': 0,
+    'resume': True,
+    'fold': 0,
+    'folds': None,
+    'fold_jobs': 1,
+    # ImageNet weights when there is no snapshot, random weights if False
+    'pretrained': True,
+    'world_size': 1,
+    # nccl on GPU, gloo on CPU if empty
+    'backend': '',
+    'master_port': 29500,
+    'synthetic_size': 256,
+    'gaze360image_dir': 'datasets/Gaze360/Image',
+    'gaze360label_dir': 'datasets/Gaze360/Label/train.label',
+    'gaze360val_label_dir': '',
+    'gazeMpiimage_dir': 'datasets/MPIIFaceGaze/Image',
+    'gazeMpiilabel_dir': 'datasets/MPIIFaceGaze/Label',
+}
+
+PRETRAINED = {
+    'ResNet18': 'https://download.pytorch.org/models/resnet18-5c106cde.pth',
+    'ResNet34': 'https://download.pytorch.org/models/resnet34-333f7ec4.pth',
+    'ResNet50': 'https://download.pytorch.org/models/resnet50-19c8e357.pth',
+    'ResNet101': 'https://download.pytorch.org/models/resnet101-5d3b4d8f.pth',
+    'ResNet152': 'https://download.pytorch.org/models/resnet152-b121ed2d.pth',
+}
+
+# arguments of the train_*.py scripts -> config keys
+SCRIPT_ARGS = {
+    'gaze360image_dir': 'gaze360image_dir',
+    'gaze360label_dir': 'gaze360label_dir',
+    'gazeMpiimage_dir': 'gazeMpiimage_dir',
+    'gazeMpiilabel_dir': 'gazeMpiilabel_dir',
+    'output': 'output',
+    'snapshot': 'snapshot',
+    'gpu_id': 'gpu',
+    'num_epochs': 'num_epochs',
+    'batch_size': 'batch_size',
+    'arch': 'arch',
+    'alpha': 'alpha',
+    'lr': 'lr',
+    'amp': 'amp',
+}
+# only used by the SocialAI fine-tuning of the scripts, Gaze360 and MPIIGaze keep the settings of their config
+SOCIALAI_ARGS = {
+    'validation_step': 'validation_step',
+    'lr_schedule': 'lr_schedule',
+    'warmup_epochs': 'warmup_epochs',
+    'shards': 'shards',
+    'augment': 'augment',
+}
+
+# learning rate multipliers of the (conv1/bn1, layer1-4, gaze fc) param groups
+PARAM_GROUPS = {
+    'backbone': (0, 1, 1),
+    'fc': (0, 0, 1),
+    'all': (1, 1, 1),
+}
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Gaze estimation using L2CSNet, config-driven training.')
+    parser.add_argument(
+        '--config', dest='config', help='JSON or YAML training config, keys as in trainer.DEFAULTS.',
+        default='configs/socialai_lin.json', type=str)
+    parser.add_argument(
+        '--set', dest='overrides', help='Config override key=value (value parsed as JSON), can be repeated.',
+        default=[], action='append')
+    args = parser.parse_args()
+    return args
+
+
+def load_config(path, overrides=()):
+    """DEFAULTS updated with the config file and the key=value overrides."""
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError('PyYAML is required for {} (pip install pyyaml), or use a JSON config'.format(path))
+            values = yaml.safe_load(f) or {}
+        else:
+            values = json.load(f)
+    for override in overrides:
+        key, value = override.split('=', 1)
+        try:
+            values[key] = json.loads(value)
+        except ValueError:
+            values[key] = value
+    unknown = set(values) - set(DEFAULTS)
+    if unknown:
+        raise KeyError('Unknown config keys {}'.format(sorted(unknown)))
+    config = dict(DEFAULTS)
+    config.update(values)
+    return config
+
+
+def get_ignored_params(model):
+    # Generator function that yields ignored params.
+    # fc_finetune is left out: forward never uses it
+    b = [model.conv1, model.bn1]
+    for i in range(len(b)):
+        for module_name, module in b[i].named_modules():
+            if 'bn' in module_name:
+                module.eval()
+            for name, param in module.named_parameters():
+                yield param
+
+
+def get_non_ignored_params(model):
+    # Generator function that yields params that will be optimized.
+    b = [model.layer1, model.layer2, model.layer3, model.layer4]
+    for i in range(len(b)):
+        for module_name, module in b[i].named_modules():
+            if 'bn' in module_name:
+                module.eval()
+            for name, param in module.named_parameters():
+                yield param
+
+
+def freeze_bn(model):
+    # BatchNorm layers put in eval mode by get_ignored_params / get_non_ignored_params, which model.train() resets
+    b = [model.conv1, model.bn1, model.layer1, model.layer2, model.layer3, model.layer4]
+    for i in range(len(b)):
+        for module_name, module in b[i].named_modules():
+            if 'bn' in module_name:
+                module.eval()
+
+
+def get_fc_params(model):
+    # Generator function that yields fc layer params.
+    b = [model.fc_yaw_gaze, model.fc_pitch_gaze]
+    for i in range(len(b)):
+        for module_name, module in b[i].named_modules():
+            for name, param in module.named_parameters():
+                yield param
+
+
+def load_filtered_state_dict(model, snapshot):
+    # By user apaszke from discuss.pytorch.org
+    model_dict = model.state_dict()
+    snapshot = {k: v for k, v in snapshot.items() if k in model_dict}
+    model_dict.update(snapshot)
+    model.load_state_dict(model_dict)
+
+
+def build_gaze360(config, transform):
+    train = datasets.Gaze360(config['gaze360label_dir'], config['gaze360image_dir'], transform, 180, 4)
+    val = None
+    if config['gaze360val_label_dir']:
+        val = datasets.Gaze360(config['gaze360val_label_dir'], config['gaze360image_dir'], transform, 180, 4,
+                               train=False)
+    return train, val
+
+
+def build_mpiigaze(config, transform):
+    folder = sorted(os.listdir(config['gazeMpiilabel_dir']))
+    paths = [os.path.join(config['gazeMpiilabel_dir'], j) for j in folder]
+    # the held-out subject of the fold is the validation set
+    train = datasets.Mpiigaze(paths, config['gazeMpiimage_dir'], transform, True, MPIIGAZE.angle, config['fold'])
+    val = datasets.Mpiigaze(paths, config['gazeMpiimage_dir'], transform, False, MPIIGAZE.angle, config['fold'])
+    return train, val
+
+
+class SyntheticGaze(Dataset):
+    """Random uint8 crops with random labels, the same for a given idx in every process, to check the engine."""
+    def __init__(self, count, size=448, layout=GAZE360, seed=0):
+        self.count = count
+        self.size = size
+        self.seed = seed
+        generator = torch.Generator().manual_seed(seed)
+        degrees = torch.rand(count, 2, generator=generator) * 120 - 60
+        self.cont_labels = degrees.numpy()
+        self.labels = layout.encode(self.cont_labels)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, idx):
+        generator = torch.Generator().manual_seed(self.seed * self.count + idx)
+        img = torch.randint(0, 256, (3, self.size, self.size), dtype=torch.uint8, generator=generator)
+        return img, self.labels[idx], torch.tensor(self.cont_labels[idx])
+
+
+def build_synthetic(config, transform):
+    return (SyntheticGaze(config['synthetic_size'], 224, GAZE360),
+            SyntheticGaze(max(config['synthetic_size'] // 4, 1), 224, GAZE360, seed=1))
+
+
+def socialai_builder(module):
+    def build(config, transform):
+        train = module.SocialAI(transform=transform, train=True, training_val=True, high_res=True)
+        val = module.SocialAI(transform=transform, train=True, training_val=False, high_res=True)
+        return train, val
+    return build
+
+
+# columns: label column learned by each output of the model, so that the outputs are always (pitch, yaw)
+DatasetSpec = namedtuple('DatasetSpec', ['build', 'layout', 'columns'])
+
+DATASETS = {
+    'gaze360': DatasetSpec(build_gaze360, GAZE360, (0, 1)),
+    'mpiigaze': DatasetSpec(build_mpiigaze, MPIIGAZE, (0, 1)),
+    'socialai': DatasetSpec(socialai_builder(datasets_local), LAYOUTS['socialai'], (1, 0)),
+    'socialai_lin': DatasetSpec(socialai_builder(datasets_local_lin), LAYOUTS['socialai'], (1, 0)),
+    'socialai_no1315': DatasetSpec(socialai_builder(datasets_local_no_par1315), LAYOUTS['socialai'], (1, 0)),
+    'synthetic': DatasetSpec(build_synthetic, GAZE360, (0, 1)),
+}
+
+
+def build_datasets(config):
+    """Train and validation (or None) datasets of config."""
+    transform = transforms.Compose([
+        transforms.Resize((448, 448)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    if config['shards']:
+        # pre-decoded uint8 crops in the label order of the dataset they were built from
+        val = os.path.join(config['shards'], 'val')
+        return (ShardDataset(os.path.join(config['shards'], 'train')),
+                ShardDataset(val) if os.path.exists(val) else None)
+    return DATASETS[config['dataset']].build(config, transform)
+
+
+def run_name(config):
+    return config['name'] or '{}_{}'.format('L2CS-' + config['dataset'], int(time.time()))
+
+
+class Trainer():
+    """
+    Training run of an L2CS model on one dataset, as configured by a trainer config (see DEFAULTS).
+    rank and world_size are set in the processes of a distributed run.
+    """
+    def __init__(self, config, rank=0, world_size=1):
+        self.config = config
+        self.rank = rank
+        self.world_size = world_size
+        self.main = rank == 0
+        if config['dataset'] not in DATASETS:
+            raise KeyError('Unknown dataset {}, expected one of {}'.format(config['dataset'], sorted(DATASETS)))
+        if config['param_groups'] not in PARAM_GROUPS:
+            raise KeyError('Unknown param_groups {}, expected one of {}'.format(config['param_groups'],
+                                                                               sorted(PARAM_GROUPS)))
+        self.spec = DATASETS[config['dataset']]
+        self.layout = self.spec.layout
+        self.columns = list(self.spec.columns)
+        self.device = select_device(config['gpu'], batch_size=config['batch_size'])
+        if world_size > 1 and self.device.type == 'cuda':
+            self.device = torch.device('cuda', rank % torch.cuda.device_count())
+            torch.cuda.set_device(self.device)
+        self.amp = MixedPrecision(config['amp'], self.device)
+
+        # self.net is the model itself, self.model the module run by the training steps (DDP wrapper if distributed)
+        self.net = self.build_model()
+        self.optimizer = self.build_optimizer()
+        self.model = self.net
+        if world_size > 1:
+            self.model = DistributedDataParallel(self.net, device_ids=[self.device] if self.device.type == 'cuda'
+                                                 else None)
+        self.train_dataset, self.val_dataset = self.build_datasets()
+        self.sampler = DistributedSampler(self.train_dataset, world_size, rank, shuffle=True) if world_size > 1 else None
+        self.train_loader = self.loader(self.train_dataset, shuffle=True, sampler=self.sampler)
+        self.val_loader = None
+        if self.val_dataset is not None and self.main:
+            self.val_loader = self.loader(self.val_dataset, shuffle=False)
+        self.scheduler = LRSchedule(self.optimizer, config['lr_schedule'], max_iter=config['num_epochs'],
+                                    warmup=config['warmup_epochs'])
+        self.augment = BatchAugment(self.layout, yaw_column=self.columns[1]) if config['augment'] else None
+        self.criterion = nn.CrossEntropyLoss()
+        self.reg_criterion = nn.MSELoss()
+
+        name = run_name(config)
+        if world_size > 1:
+            # the run name of rank 0, the processes may not have started in the same second
+            names = [name]
+            dist.broadcast_object_list(names, src=0)
+            name = names[0]
+        self.output = os.path.join(config['output'], name)
+        if config['dataset'] == 'mpiigaze':
+            self.output = os.path.join(self.output, 'fold' + str(config['fold']))
+        self.start_epoch = 0
+        self.min_error = None
+        if config['resume'] and os.path.exists(config['checkpoint']):
+            self.resume(config['checkpoint'])
+        self.writer = None
+        if self.main:
+            if not os.path.exists(self.output):
+                os.makedirs(self.output)
+            snapshots = [name for name in os.listdir(self.output)
+                         if name.startswith('_epoch_') and name.endswith('.pkl')]
+            snapshots.sort(key=lambda name: int(name[len('_epoch_'):-len('.pkl')]))
+            self.writer = CheckpointWriter(keep_last=config['keep_last'],
+                                           retained=[os.path.join(self.output, name) for name in snapshots])
+
+    def log(self, *message):
+        if self.main:
+            print(*message)
+
+    def build_model(self):
+        config = self.config
+        model = getArch(config['arch'], self.layout.bins)
+        if config['snapshot']:
+            self.log('loading model from {} ...'.format(config['snapshot']))
+            model.load_state_dict(torch.load(config['snapshot'], map_location='cpu'))
+        elif config['pretrained']:
+            load_filtered_state_dict(model, model_zoo.load_url(PRETRAINED.get(config['arch'], PRETRAINED['ResNet50'])))
+        # kept in the snapshots for the L2CS loaders, but not trained: forward never uses it
+        model.fc_finetune.requires_grad_(False)
+        return model.to(self.device)
+
+    def build_datasets(self):
+        return build_datasets(self.config)
+
+    def loader(self, dataset, shuffle, sampler=None):
+        return make_loader(dataset, self.config['batch_size'], shuffle=shuffle, device=self.device,
+                           num_workers=self.config['num_workers'], sampler=sampler,
+                           prefetch_factor=self.config['prefetch_factor'],
+                           persistent_workers=self.config['persistent_workers'], world_size=self.world_size)
+
+    def build_optimizer(self):
+        lr = self.config['lr']
+        factors = PARAM_GROUPS[self.config['param_groups']]
+        groups = [get_ignored_params(self.net), get_non_ignored_params(self.net), get_fc_params(self.net)]
+        return torch.optim.Adam([{'params': params, 'lr': lr * factor} for params, factor in zip(groups, factors)],
+                                lr, weight_decay=self.config['weight_decay'])
+
+    def batch(self, batch):
+        """Images and labels of a loader batch on the device, labels reordered as (pitch, yaw)."""
+        images, labels, cont_labels = batch[:3]
+        images = images.to(self.device, non_blocking=True)
+        labels = labels.to(self.device, non_blocking=True)
+        cont_labels = cont_labels.to(self.device, non_blocking=True)
+        if self.augment is not None and self.net.training:
+            images, labels, cont_labels = self.augment(images, labels, cont_labels)
+        elif images.dtype == torch.uint8:
+            images = normalize_batch(images, channels_last=False)
+        return images, labels[:, self.columns], cont_labels[:, self.columns]
+
+    def losses(self, outputs, labels, cont_labels):
+        """Cross entropy + alpha * MSE of the decoded angle, for the pitch and the yaw outputs."""
+        return [self.criterion(output, labels[:, i]) +
+                self.config['alpha'] * self.reg_criterion(self.layout.decode(output), cont_labels[:, i])
+                for i, output in enumerate(outputs)]
+
+    def train_epoch(self, epoch):
+        config = self.config
+        steps = config['accumulation_steps']
+        self.model.train()
+        # on the model itself, not the DDP wrapper
+        freeze_bn(self.net)
+        self.scheduler.step(epoch)
+        if self.sampler is not None:
+            self.sampler.set_epoch(epoch)
+        self.optimizer.zero_grad(set_to_none=True)
+        meter = TrainMeter(self.device)
+        iters = len(self.train_loader)
+        for i, batch in enumerate(meter.timed(self.train_loader)):
+            images, labels, cont_labels = self.batch(batch)
+            outputs = self.amp.forward(self.model, images)
+            losses = self.losses(outputs, labels, cont_labels)
+            self.amp.backward([loss / steps for loss in losses])
+            if (i + 1) % steps == 0 or i + 1 == iters:
+                self.amp.apply(self.optimizer)
+            meter.update(losses, images.shape[0])
+
+            if (i + 1) % config['log_interval'] == 0:
+                meter.flush(i + 1)
+            for report in meter.reports():
+                self.log_report(epoch, iters, report)
+        for report in meter.reports(block=True):
+            self.log_report(epoch, iters, report)
+        return meter.means()
+
+    def log_report(self, epoch, iters, report):
+        self.log('Epoch [%d/%d], Iter [%d/%d] Losses: Gaze Yaw %.4f,Gaze Pitch %.4f, %.1f images/s, '
+                 'data %.2f s, compute %.2f s' % (
+                     epoch + 1, self.config['num_epochs'], report['iteration'], iters, report['yaw'],
+                     report['pitch'], report['images_per_s'], report['data_time'], report['compute_time']))
+
+    def validate(self):
+        """Mean pitch and yaw losses and angular error statistics of the validation set (on rank 0)."""
+        self.net.eval()
+        meter = AngularErrorMeter()
+        sums = torch.zeros(2, device=self.device)
+        with torch.no_grad():
+            for batch in self.val_loader:
+                images, labels, cont_labels = self.batch(batch)
+                outputs = self.amp.forward(self.net, images)
+                sums += torch.stack(self.losses(outputs, labels, cont_labels))
+                gaze = torch.stack([self.layout.decode(output) for output in outputs], 1)
+                meter.update(gaze * np.pi / 180, cont_labels * np.pi / 180)
+        stats = meter.compute()
+        stats['loss_pitch'], stats['loss_yaw'] = (sums / max(len(self.val_loader), 1)).tolist()
+        return stats
+
+    def state(self, epoch):
+        return {
+            "epoch": epoch,
+            "min_error_pitch_yaw": self.min_error or 0,
+            "model_state_dict": self.net.state_dict(),
+            'optimizer_state_dict': self.optimizer.state_dict(),
+            'scaler_state_dict': self.amp.state_dict(),
+            'scheduler_state_dict': self.scheduler.state_dict(),
+            'rng_state': torch.get_rng_state(),
+            'output': self.output,
+            'config': self.config,
+        }
+
+    def resume(self, path):
+        self.log('load model from {} ...'.format(path))
+        checkpoint = torch.load(path, map_location='cpu')
+        self.net.load_state_dict(checkpoint['model_state_dict'])
+        try:
+            self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        except ValueError as e:
+            # checkpoints written when fc_finetune was still in the first param group
+            self.log('Optimizer state not restored ({}), the Adam moments start again.'.format(e))
+        self.amp.load_state_dict(checkpoint.get('scaler_state_dict'))
+        self.scheduler.load_state_dict(checkpoint.get('scheduler_state_dict'))
+        if 'rng_state' in checkpoint:
+            torch.set_rng_state(checkpoint['rng_state'])
+        self.start_epoch = checkpoint['epoch'] + 1
+        self.min_error = checkpoint['min_error_pitch_yaw'] or None
+        self.output = checkpoint.get('output', self.output)
+        self.log('Checkpoint of epoch {} recovered!'.format(checkpoint['epoch'] + 1))
+
+    def fit(self):
+        config = self.config
+        cudnn.benchmark = True
+        self.log('\ntrain configuration, gpu_id={}, batch_size={}x{}x{}, model_arch={}\nStart training dataset={}, '
+                 'loader={}, output={}-------------------------\n'.format(
+                     config['gpu'], config['batch_size'], config['accumulation_steps'], self.world_size,
+                     config['arch'], config['dataset'], len(self.train_loader), self.output))
+        for epoch in range(self.start_epoch, config['num_epochs']):
+            start = time.time()
+            pitch, yaw = self.train_epoch(epoch)
+            self.log('Epoch [%d/%d] Losses: Gaze Yaw %.4f,Gaze Pitch %.4f (%.1f s)' % (
+                epoch + 1, config['num_epochs'], yaw, pitch, time.time() - start))
+            if not self.main:
+                continue
+            snapshot = os.path.join(self.output, '_epoch_' + str(epoch + 1) + '.pkl')
+            self.writer.save(self.net.state_dict(), snapshot, retain=True)
+
+            if self.val_loader is not None and (epoch + 1) % int(config['validation_step']) == 0:
+                stats = self.validate()
+                total_error = stats['loss_pitch'] + stats['loss_yaw']
+                print('Validation: Losses: Gaze Yaw %.4f,Gaze Pitch %.4f, angular error %.3f (median %.3f)' % (
+                    stats['loss_yaw'], stats['loss_pitch'], stats['mean'], stats['median']))
+                if self.min_error is None or total_error < self.min_error:
+                    self.min_error = total_error
+                    self.writer.save(self.net.state_dict(), os.path.join(self.output, 'best_model.pth'))
+                    self.writer.mark_best(snapshot)
+                    print('Found a better model at epoch', epoch + 1, '. Best model updated --> min_avg_error:',
+                          self.min_error)
+            self.writer.save(self.state(epoch), config['checkpoint'])
+        if self.main:
+            self.writer.close()
+            if os.path.exists(config['checkpoint']):
+                os.remove(config['checkpoint'])
+
+
+def run_worker(rank, config, world_size):
+    """One process of a distributed run, started by mp.spawn or torchrun."""
+    backend = config['backend'] or ('nccl' if config['gpu'] != 'cpu' and torch.cuda.is_available() else 'gloo')
+    os.environ.setdefault('MASTER_ADDR', '127.0.0.1')
+    os.environ.setdefault('MASTER_PORT', str(config['master_port']))
+    if backend == 'gloo':
+        # the CPU cores are shared between the processes
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+    try:
+        Trainer(config, rank, world_size).fit()
+    finally:
+        dist.destroy_process_group()
+
+
+def train(config):
+    if 'RANK' in os.environ and 'WORLD_SIZE' in os.environ:
+        # started by torchrun
+        run_worker(int(os.environ['RANK']), config, int(os.environ['WORLD_SIZE']))
+    elif config['world_size'] > 1:
+        mp.spawn(run_worker, args=(config, config['world_size']), nprocs=config['world_size'], join=True)
+    else:
+        Trainer(config).fit()
+
+
+def train_fold(config, threads=None):
+    if threads:
+        torch.set_num_threads(threads)
+    if config['world_size'] > 1 and 'RANK' not in os.environ:
+        # the port of this fold, not one inherited from the parent process
+        os.environ['MASTER_PORT'] = str(config['master_port'])
+    train(config)
+    return config['fold']
+
+
+def train_folds(config):
+    """MPIIGaze leave-one-out folds of one run (output/<name>/foldN), fold_jobs at a time in separate processes."""
+    name = run_name(config)
+    root, ext = os.path.splitext(config['checkpoint'])
+    gpus = config['gpu'].split(',')
+    # concurrent distributed folds each need their own rendezvous port
+    configs = [dict(config, fold=fold, name=name, checkpoint='{}_fold{}{}'.format(root, fold, ext),
+                    gpu=gpus[i % len(gpus)], master_port=config['master_port'] + i)
+               for i, fold in enumerate(config['folds'])]
+    jobs = max(1, min(config['fold_jobs'], len(configs)))
+    if jobs == 1:
+        for fold_config in configs:
+            train_fold(fold_config)
+        return
+    threads = max(1, (os.cpu_count() or 1) // jobs)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        for fold in executor.map(train_fold, configs, [threads] * len(configs)):
+            print('fold {} trained'.format(fold))
+
+
+def run(config):
+    if config['dataset'] == 'mpiigaze' and config['folds'] is not None:
+        train_folds(config)
+    else:
+        train(config)
+
+
+def script_config(args, presets):
+    """
+    Config of the command line of a train_*.py script: presets maps its --dataset names to a config file (relative
+    to this folder) and extra config values, updated with the arguments of the script.
+    """
+    if args.dataset not in presets:
+        raise KeyError('Unknown dataset {}, expected one of {}'.format(args.dataset, sorted(presets)))
+    path, values = presets[args.dataset]
+    config = load_config(os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+    config.update(values)
+    keys = dict(SCRIPT_ARGS)
+    if config['dataset'].startswith('socialai'):
+        keys.update(SOCIALAI_ARGS)
+    for arg, key in keys.items():
+        if hasattr(args, arg):
+            config[key] = getattr(args, arg)
+    return config
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    run(load_config(args.config, args.overrides))
@@ -9,7 +9,7 @@ from math import cos, sin
 from pathlib import Path
 import subprocess
 import re
-from model import L2CS
+from model import L2CS, L2CSInference
 import torchvision
 import sys
 
@@ -50,9 +50,27 @@ def draw_gaze(a,b,c,d,image_in, pitchyaw, thickness=2, color=(255, 255, 0),sclae
                    thickness, cv2.LINE_AA, tipLength=0.18)
     return image_out    
 
+def getArch(arch,bins,inference=False):
+    # Base network structure, L2CSInference (no fc_finetune, foldable BatchNorm) if inference
+    network = L2CSInference if inference else L2CS
+    if arch == 'ResNet18':
+        model = network( torchvision.models.resnet.BasicBlock,[2, 2,  2, 2], bins)
+    elif arch == 'ResNet34':
+        model = network( torchvision.models.resnet.BasicBlock,[3, 4,  6, 3], bins)
+    elif arch == 'ResNet101':
+        model = network( torchvision.models.resnet.Bottleneck,[3, 4, 23, 3], bins)
+    elif arch == 'ResNet152':
+        model = network( torchvision.models.resnet.Bottleneck,[3, 8, 36, 3], bins)
+    else:
+        if arch != 'ResNet50':
+            print('Invalid value for architecture is passed! '
+                'The default value of ResNet50 will be used instead!')
+        model = network( torchvision.models.resnet.Bottleneck, [3, 4, 6,  3], bins)
+    return model
+
 def select_device(device='', batch_size=None):
     # device = 'cpu' or '0' or '0,1,2,3'
-    s = f'YOLOv3 🚀 {git_describe() or date_modified()} torch {torch.__version__} '  # string
+    s = f'YOLOv3 🚀 {git_describe()} torch {torch.__version__} '  # string
     cpu = device.lower() == 'cpu'
     if cpu:
         os.environ['CUDA_VISIBLE_DEVICES'] = '-1'  # force torch.cuda.is_available() = False
@@ -75,12 +93,24 @@ def select_device(device='', batch_size=None):
 
     return torch.device('cuda:0' if cuda else 'cpu')
 
+def set_cpu_threads(threads=None, interop_threads=None):
+    # intra-op threads split a single conv/matmul, inter-op threads run independent ops concurrently.
+    # torch only accepts the inter-op setting before the first parallel work is started.
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            print('inter-op threads already initialized, keeping %d' % torch.get_num_interop_threads())
+    return torch.get_num_threads(), torch.get_num_interop_threads()
+
 def spherical2cartesial(x):
-    
-    output = torch.zeros(x.size(0),3)
+    # batched gazeto3d: (N, 2) angles in radians -> (N, 3) unit vectors, on the device of x
+    output = torch.zeros(x.size(0), 3, dtype=x.dtype, device=x.device)
+    output[:,0] = -torch.cos(x[:,1])*torch.sin(x[:,0])
+    output[:,1] = -torch.sin(x[:,1])
     output[:,2] = -torch.cos(x[:,1])*torch.cos(x[:,0])
-    output[:,0] = torch.cos(x[:,1])*torch.sin(x[:,0])
-    output[:,1] = torch.sin(x[:,1])
 
     return output
     
@@ -89,11 +119,8 @@ def compute_angular_error(input,target):
     input = spherical2cartesial(input)
     target = spherical2cartesial(target)
 
-    input = input.view(-1,3,1)
-    target = target.view(-1,1,3)
-    output_dot = torch.bmm(target,input)
-    output_dot = output_dot.view(-1)
-    output_dot = torch.acos(output_dot)
+    output_dot = torch.sum(input*target, 1)
+    output_dot = torch.acos(output_dot.clamp(-1.0, 0.9999999))
     output_dot = output_dot.data
     output_dot = 180*torch.mean(output_dot)/math.pi
     return output_dot
@@ -9,16 +9,14 @@ from math import cos, sin
 from pathlib import Path
 import subprocess
 import re
-import imgaug.augmenters as iaa
 from model import L2CS
 import torchvision
 import sys
 
 
 def augmentation(image, yaw):
-
-    horizontalFlip = iaa.Fliplr(1)
-    image_aug = horizontalFlip.augment_image(image)
+    # same as imgaug's Fliplr(1) on an (H, W, C) image; augment.BatchAugment does it on whole batches
+    image_aug = np.ascontiguousarray(image[:, ::-1])
     yaw_aug = -yaw
 
     return image_aug, yaw_aug
@@ -0,0 +1,280 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+import cv2
+
+from utils import draw_gaze
+
+"""
+                                    ----------------------------------------------------------
+ Staged offline processing of recordings. The steps that demo_local_folder.prediction runs one after the other for
+ every frame run concurrently, each stage working on a different frame:
+
+     detect   RetinaFace on the frame (optionally downscaled to detect_width), biggest face kept      thread pool
+     crop     448x448 uint8 crop of the face                                                           thread pool
+     gaze     one L2CS forward pass for the crops of all the frames waiting, up to batch_size          one thread
+     render   gaze arrow and face box drawn on the frame, downscaled to render_width (skipped headless) thread pool
+     write    VideoWriter (optional)                                                                   one thread
+
+ The detect workers share the single RetinaFace model of the GazePipeline, whose forward pass is not thread-safe:
+ they downscale their frames in parallel and run the detector one at a time, under a lock.
+
+ The stages are linked by bounded queues of futures in frame order, so the results come out in the order of the
+ source and a slow stage holds back the ones before it instead of filling the memory.
+
+     staged = StagedPipeline(GazePipeline(snapshot), batch_size=8, render=True, video='out.avi')
+     with FrameSource('recordings/p2.mp4') as frames:
+         for result in staged.run(frames):
+             result.index, result.yaw, result.pitch      # radians, None when no face was found
+     staged.report()                                      # per-stage latency and throughput
+"""
+
+STAGES = ['detect', 'crop', 'gaze', 'render', 'write']
+FrameResult = namedtuple('FrameResult', ['index', 'timestamp', 'bbox', 'score', 'yaw', 'pitch', 'image'])
+
+
+class FrameState():
+    """A frame and what the stages computed for it so far."""
+    def __init__(self, frame):
+        self.index = frame.index
+        self.timestamp = frame.timestamp
+        self.image = frame.image
+        self.bbox = None
+        self.score = None
+        self.crop = None
+        self.yaw = None
+        self.pitch = None
+
+    def result(self):
+        return FrameResult(self.index, self.timestamp, self.bbox, self.score, self.yaw, self.pitch, self.image)
+
+
+def completed(value=None, error=None):
+    future = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+    return future
+
+
+class StagedPipeline():
+    """
+    Single-person gaze of every frame of a source with the stages above, on top of a GazePipeline
+    """
+    def __init__(self, pipeline, workers=2, batch_size=8, queue_size=16, render=True, video=None, fps=23,
+                 render_width=1920, detect_width=None):
+        """
+        workers: threads of each of the detect, crop and render thread pools.
+        render: draw the gaze on the frames (FrameResult.image), video: also write them to this file.
+        render_width: wider frames are rendered downscaled (4K recordings at 1920x1080, as prediction() did).
+        detect_width: wider frames are downscaled for the face detection only, the crops come from the full frame.
+        """
+        self.pipeline = pipeline
+        self.workers = workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.render = render or video is not None
+        self.video = video
+        self.fps = fps
+        self.render_width = render_width
+        self.detect_width = detect_width
+        self.writer = None
+        self.detect_lock = threading.Lock()
+        self.latencies = {name: [] for name in STAGES}
+        self.elapsed = 0.0
+        self.frames = 0
+
+    def timed(self, name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.latencies[name].append(time.perf_counter() - start)
+        return result
+
+    def detect(self, state):
+        image = state.image
+        scale = np.ones(4)
+        if self.detect_width and image.shape[1] > self.detect_width:
+            height, width = image.shape[:2]
+            image = cv2.resize(image, (self.detect_width, int(round(height * self.detect_width / width))))
+            # per axis, so that the boxes clipped to the downscaled frame stay inside the full one
+            scale = np.tile([width / image.shape[1], height / image.shape[0]], 2)
+        with self.detect_lock:
+            bboxes, scores = self.pipeline.detect(image)
+        if len(bboxes) > 0:
+            # single-person gaze tracking: the biggest face
+            biggest = np.argmax(bboxes[:, 2] - bboxes[:, 0])
+            state.bbox = np.round(bboxes[biggest] * scale).astype(np.int64)
+            state.score = float(scores[biggest])
+        return state
+
+    def crop(self, state):
+        if state.bbox is not None:
+            state.crop = self.pipeline.crop(state.image, state.bbox[None])
+        return state
+
+    def estimate(self, states):
+        faces = [state for state in states if state.crop is not None]
+        if faces:
+            yaw, pitch = self.pipeline.estimate_crops(np.concatenate([state.crop for state in faces]))
+            for state, state_yaw, state_pitch in zip(faces, yaw.tolist(), pitch.tolist()):
+                state.yaw = state_yaw
+                state.pitch = state_pitch
+                state.crop = None
+        return states
+
+    def draw(self, state):
+        frame = state.image
+        scale = 1
+        if frame.shape[1] > self.render_width:
+            scale = frame.shape[1] / self.render_width
+            frame = cv2.resize(frame, (self.render_width, int(round(frame.shape[0] / scale))))
+        if state.yaw is not None:
+            x_min, y_min, x_max, y_max = (state.bbox / scale).astype(int).tolist()
+            draw_gaze(x_min, y_min, x_max - x_min, y_max - y_min, frame, (state.yaw, state.pitch), color=(0, 0, 255))
+            cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), (0, 255, 0), 1)
+        state.image = frame
+        return state
+
+    def write(self, state):
+        if self.writer is None:
+            height, width = state.image.shape[:2]
+            self.writer = cv2.VideoWriter(self.video, 0, self.fps, (width, height))
+        self.writer.write(state.image)
+        return state
+
+    def put(self, target, item):
+        while not self.stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, source):
+        """Next future of source, None at its end or when the run is stopped."""
+        while not self.stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def feed(self, frames, executor, target):
+        try:
+            for frame in frames:
+                if self.stop.is_set():
+                    break
+                self.put(target, executor.submit(self.timed, 'detect', self.detect, FrameState(frame)))
+        except Exception as e:
+            self.put(target, completed(error=e))
+        self.put(target, None)
+
+    def chain(self, name, fn, executor, source, target):
+        """Submits fn on the result of every future of source, in order."""
+        while True:
+            future = self.get(source)
+            if future is None:
+                break
+            try:
+                state = future.result()
+            except Exception as e:
+                self.put(target, completed(error=e))
+                break
+            self.put(target, executor.submit(self.timed, name, fn, state))
+        self.put(target, None)
+
+    def gaze_loop(self, source, target):
+        """Gaze of the frames waiting in source, batch_size at most per forward pass."""
+        end = False
+        while not end:
+            future = self.get(source)
+            if future is None:
+                break
+            futures = [future]
+            while len(futures) < self.batch_size:
+                try:
+                    future = source.get_nowait()
+                except queue.Empty:
+                    break
+                if future is None:
+                    end = True
+                    break
+                futures.append(future)
+            try:
+                states = self.timed('gaze', self.estimate, [future.result() for future in futures])
+            except Exception as e:
+                self.put(target, completed(error=e))
+                break
+            for state in states:
+                self.put(target, completed(state))
+        self.put(target, None)
+
+    def run(self, frames):
+        """FrameResult of every frame of frames (an iterable of frames.Frame, e.g. a FrameSource), in order."""
+        self.stop = threading.Event()
+        pools = [ThreadPoolExecutor(max_workers=self.workers) for _ in range(3)]
+        # a single writer thread keeps the frame order
+        pools.append(ThreadPoolExecutor(max_workers=1))
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(5)]
+        threads = [
+            threading.Thread(target=self.feed, args=(frames, pools[0], queues[0])),
+            threading.Thread(target=self.chain, args=('crop', self.crop, pools[1], queues[0], queues[1])),
+            threading.Thread(target=self.gaze_loop, args=(queues[1], queues[2])),
+        ]
+        last = queues[2]
+        if self.render:
+            threads.append(threading.Thread(target=self.chain,
+                                            args=('render', self.draw, pools[2], queues[2], queues[3])))
+            last = queues[3]
+        if self.video is not None:
+            threads.append(threading.Thread(target=self.chain,
+                                            args=('write', self.write, pools[3], queues[3], queues[4])))
+            last = queues[4]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        start = time.perf_counter()
+        try:
+            while True:
+                future = self.get(last)
+                if future is None:
+                    break
+                self.frames += 1
+                state = future.result()
+                if not self.render:
+                    # headless: the frames are not kept once their gaze is known
+                    state.image = None
+                yield state.result()
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+            for pool in pools:
+                pool.shutdown()
+            if self.writer is not None:
+                self.writer.release()
+                self.writer = None
+
+    def stats(self):
+        """Per stage: calls, mean and p95 latency (ms) and calls per second of the runs so far."""
+        stats = {}
+        for name in STAGES:
+            latencies = np.array(self.latencies[name]) * 1000.0
+            if len(latencies) == 0:
+                continue
+            stats[name] = {'count': len(latencies), 'mean': latencies.mean(), 'p95': np.percentile(latencies, 95),
+                           'per_s': len(latencies) / max(self.elapsed, 1e-9)}
+        return stats
+
+    def report(self):
+        for name, stage in self.stats().items():
+            print('{:<8} {:6d} calls  mean {:8.2f} ms  p95 {:8.2f} ms  {:8.1f} calls/s'.format(
+                name, stage['count'], stage['mean'], stage['p95'], stage['per_s']))
+        print('{} frames in {:.1f} s: {:.1f} frames/s'.format(
+            self.frames, self.elapsed, self.frames / max(self.elapsed, 1e-9)))